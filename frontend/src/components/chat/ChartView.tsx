@@ -0,0 +1,64 @@
+import React, { useEffect, useState } from 'react';
+import Plot from 'react-plotly.js';
+
+// compact payloads ({format, data, layout, template}) reference Plotly
+// templates by name, each one is fetched once and shared by every chart
+const templateCache: Record<string, Promise<any>> = {};
+
+const loadTemplate = (name: string): Promise<any> => {
+  if (!templateCache[name]) {
+    templateCache[name] = fetch(`http://localhost:8021/chart-templates/${name}`)
+      .then(response => (response.ok ? response.json() : null))
+      .catch(() => null);
+  }
+  return templateCache[name];
+};
+
+// charts arrive as fig.to_json() strings (older messages) or compact objects
+export const parseChart = (chartData: any): any => {
+  if (!chartData) return null;
+  if (typeof chartData !== 'string') return chartData;
+  try {
+    return JSON.parse(chartData);
+  } catch (e) {
+    console.warn('Failed to parse chart data:', e);
+    return null;
+  }
+};
+
+const ChartView: React.FC<{ chartData: any }> = ({ chartData }) => {
+  const chart = parseChart(chartData);
+  const templateName: string | null = chart?.template ?? null;
+  const [template, setTemplate] = useState<any>(null);
+
+  useEffect(() => {
+    if (!templateName) return;
+    let active = true;
+    loadTemplate(templateName).then(loaded => {
+      if (active) setTemplate(loaded);
+    });
+    return () => {
+      active = false;
+    };
+  }, [templateName]);
+
+  if (!chart || !chart.data) return null;
+  // numeric arrays stay {dtype, bdata}, plotly.js decodes typed arrays itself
+  const layout = {
+    ...(chart.layout || {}),
+    ...(templateName && template ? { template } : {}),
+    autosize: true,
+  };
+  return (
+    <div style={{ padding: '1rem', width: '100%' }}>
+      <Plot
+        data={chart.data}
+        layout={layout}
+        useResizeHandler
+        style={{ width: '100%', height: '400px' }}
+      />
+    </div>
+  );
+};
+
+export default ChartView;
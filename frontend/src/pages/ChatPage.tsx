@@ -17,7 +17,7 @@ import {
 } from '../components/chat/ChatStyles';
 import { useAuth } from '../contexts/AuthContext';
 import axios from 'axios';
-import Plot from 'react-plotly.js';
+import ChartView from '../components/chat/ChartView';
 
 interface Message {
   id: string;
@@ -33,6 +33,46 @@ interface Chat {
   messages: Message[];
 }
 
+// POSTs to the Server-Sent Events endpoint, EventSource only supports GET
+const streamQuery = async (
+  query: string,
+  threadId: number,
+  token: string | null,
+  onEvent: (event: string, data: any) => void
+) => {
+  const response = await fetch('http://localhost:8021/query/stream', {
+    method: 'POST',
+    headers: {
+      Authorization: `Bearer ${token}`,
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({ query, thread_id: threadId, thread_specific_call: false }),
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Query failed with status ${response.status}`);
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      let data = '';
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+};
+
 const ChatPage: React.FC = () => {
   const { token } = useAuth();
   const [chats, setChats] = useState<Chat[]>([]);
@@ -171,41 +211,36 @@ const handleSendMessage = async () => {
       );
     }
 
-    const response = await axios.post(
-      'http://localhost:8021/query',
-      {
-        query: message,
-        thread_id: parseInt(activeChat),
-        thread_specific_call: false,
-      },
-      {
-        headers: { Authorization: `Bearer ${token}` },
-      }
-    );
-
-    const { response: botResponse, chart } = response.data;
-
-    const finalBotMessage: Message = {
-      id: Date.now().toString() + '-bot',
-      content: botResponse,
-      isUser: false,
-      timestamp: new Date(),
-      chartData: chart || null,
-    };
+    const updateBotMessage = (update: Partial<Message>) =>
+      setChats(prevChats =>
+        prevChats.map(chat =>
+          chat.id === activeChat
+            ? {
+                ...chat,
+                messages: chat.messages.map(msg =>
+                  msg.id === loadingBotMessage.id ? { ...msg, ...update } : msg
+                ),
+              }
+            : chat
+        )
+      );
 
-    // Replace the placeholder loading message with actual bot message
-    setChats(prevChats =>
-      prevChats.map(chat =>
-        chat.id === activeChat
-          ? {
-              ...chat,
-              messages: chat.messages.map(msg =>
-                msg.id === loadingBotMessage.id ? finalBotMessage : msg
-              ),
-            }
-          : chat
-      )
-    );
+    // fill the placeholder as the answer streams in
+    let text = '';
+    await streamQuery(message, parseInt(activeChat), token, (event, data) => {
+      if (event === 'sources') {
+        if (!text) updateBotMessage({ content: `Reading ${data.length} sources...` });
+      } else if (event === 'text') {
+        text += data;
+        updateBotMessage({ content: text });
+      } else if (event === 'chart') {
+        updateBotMessage({ chartData: data });
+      } else if (event === 'done') {
+        updateBotMessage({ content: data.response, chartData: data.chart || null });
+      } else if (event === 'error') {
+        throw new Error(data.detail);
+      }
+    });
   } catch (error) {
     console.error('Error sending message:', error);
 
@@ -342,28 +377,7 @@ const handleSendMessage = async () => {
     {msg.content}
   </div>
 </div>
-{(() => {
-  console.log('ChartData:', msg.chartData);
-  if(msg.chartData === null) return null;
-  const parsedChartData = JSON.parse(msg.chartData);
-  const data = parsedChartData.data;
-  const layout = parsedChartData.layout;
-  return (
-    msg.chartData && (
-      <div style={{ padding: '1rem', width: '100%' }}>
-        <Plot
-          data={data}
-layout={{
-  ...(layout ),
-  autosize: true,
-}}
-          useResizeHandler
-          style={{ width: '100%', height: '400px' }}
-        />
-      </div>
-    )
-  );
-})()}
+<ChartView chartData={msg.chartData} />
 
               </div>
               
@@ -1,13 +1,19 @@
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import threading
 import traceback
 import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 from sqlalchemy.orm import Session
 from langchain.agents import AgentType,  initialize_agent
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.output_parsers import PydanticOutputParser
 from langchain_experimental.tools import PythonREPLTool
+from langchain_experimental.utilities import PythonREPL
 # from typing import Optional, List, Any
 import os
 from typing import Optional
@@ -15,23 +21,33 @@ from typing import Optional
 from bytes.database.db import DBManager
 # from bytes.retriver.PostgresMessageHistory import PostgresMessageHistory
 from bytes.retriver.retriver import  Retriver
+from bytes.retriver.ContextPacker import ContextPacker
+from bytes.retriver.SemanticAnswerCache import SemanticAnswerCache
 #from bytes.agent_services.bedrock_llm_wrapper import BedrockLLM
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
 from bytes.agent_services.agent_schemas import ExtractedInsights, FinancialOutput
+from bytes.agent_services.chart_builder import build_chart
+from bytes.agent_services.chart_executor import ChartExecutor
+from bytes.agent_services.chart_intent import speculative_instructions, wants_chart
+from bytes.agent_services import json_repair
+from bytes.agent_services.json_repair import RepairError, parse_model
+from bytes.agent_services.llm_scheduler import (
+    LLM_BASE_URL,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_SPECULATIVE,
+    llm_http_client,
+    use_priority,
+)
 from pydantic_ai import Agent,Tool
 from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.providers.openai import OpenAIProvider
+from openai import AsyncOpenAI
 from pydantic import BaseModel
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import plotly.io as pio
 from dataclasses import dataclass
 from pydantic_graph import BaseNode,End,Graph,GraphRunContext
 
 
-parser = PydanticOutputParser(pydantic_object=ExtractedInsights)
 
 llm = ChatGoogleGenerativeAI(
     model="gemini-1.5-flash",
@@ -42,7 +58,97 @@ llm = ChatGoogleGenerativeAI(
 
 
 
+# "on" enables the semantic answer cache
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "off")
+# minimum cosine similarity between two questions to reuse an answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+
+# threads running the blocking embedding, search and cache calls of queries
+QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", "8"))
+# start the graph agent alongside the summarizer when a chart looks likely
+CHART_SPECULATION = os.getenv("CHART_SPECULATION", "false").lower() == "true"
+# prompt tokens spent on retrieved context per query
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+
 retriver = Retriver()
+context_packer = ContextPacker(token_budget=CONTEXT_TOKEN_BUDGET)
+query_executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="query")
+chart_executor = ChartExecutor(
+    workers=int(os.getenv("CHART_WORKERS", "2")),
+    timeout=float(os.getenv("CHART_TIMEOUT_SECONDS", "10")),
+    memory_mb=int(os.getenv("CHART_MEMORY_MB", "1024")),
+    max_jobs=int(os.getenv("CHART_MAX_JOBS", "50")),
+)
+speculation_counters = {"started": 0, "used": 0, "discarded": 0, "failed": 0}
+
+# per request values read by the tools of the shared langchain agent
+agent_thread_id: contextvars.ContextVar[int] = contextvars.ContextVar("agent_thread_id", default=0)
+agent_repl: contextvars.ContextVar[PythonREPL] = contextvars.ContextVar("agent_repl")
+
+MAIN_AGENT_PROMPT = """
+            You are a master financial analyst. Your job is to provide a comprehensive answer to the user's query by orchestrating specialized tools.
+            WORKFLOW:
+            1.  First, you MUST use the extract_pdf_insights tool to get the related data from the document.
+            2.  Review the explanation from the output of the first tool.
+            3.  For charts:
+                i.  Write Python code using plotly to create a chart.
+                ii.  Assign the chart to variable `fig`, convert to JSON using `fig.to_json()` and print it.
+            4.  Finally, synthesize the explanation and chart into a full answer.
+            pls finish this within 3 calls if more calls are needed return "I cannot answer this question, please try another one"
+            Final output format:
+            {
+            "text_explanation": "your explanation here",
+            "chart_json": "...plotly fig.to_json() string here...",
+            "table_json": {...}  // if not applicable, return null
+            }
+
+            ⚠️ DO NOT include markdown, HTML, or extra commentary — return only the JSON object.
+            ⚠️ If the answer can't be completed in 3 steps, respond with:
+            { "text_explanation": "I cannot answer this question, please try another one", "chart_json": null, "table_json": null }
+
+            Start!
+            """
+
+
+class RequestREPL(PythonREPL):
+    """REPL of the current request, so concurrent queries never see each other's variables."""
+
+    def run(self, command: str, timeout: Optional[int] = None) -> str:
+        return agent_repl.get().run(command, timeout)
+
+
+def build_model(model_name: str, api_key: str) -> OpenAIModel:
+    """OpenAI compatible model on the shared, rate limited LLM client."""
+    return OpenAIModel(
+        model_name=model_name,
+        provider=OpenAIProvider(
+            openai_client=AsyncOpenAI(
+                base_url=LLM_BASE_URL,
+                api_key=api_key,
+                http_client=llm_http_client,
+                # retries are done by the scheduler
+                max_retries=0,
+            )
+        ),
+    )
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the bounded query executor, off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(query_executor, partial(func, *args, **kwargs))
+
+
+def pack_context(query: str, results) -> list:
+    blocks, stats = context_packer.pack(results)
+    print(
+        f"Packed context for {query!r}: {stats['raw_tokens']} -> {stats['packed_tokens']} tokens "
+        f"({stats['saved_tokens']} saved, {stats['merged']} merged, "
+        f"{stats['duplicates']} duplicates, {stats['over_budget']} over budget)"
+    )
+    return blocks
+
+
 class Agent_Service:
     def __init__(self,model:str,db_manager:DBManager) -> None:
         self.model = model
@@ -54,15 +160,16 @@ class Agent_Service:
             google_api_key=os.getenv("GEMINI_API_KEY"),
         )
         self.db_manager = db_manager
+        self.main_agent = None
+        self._main_agent_lock = threading.Lock()
     def get_context(self, query: str, thread_id: int = 0) -> tuple[str, list[dict]]:
-        results = retriver.retrive(query, thread_id=thread_id)
+        results = retriver.retrive_reranked(query, thread_id=thread_id)
         source_json = []
         prompt = ""
 
-        for doc in results:
-            metadata = doc.metadata
-            doc_id = metadata.get("doc_id", "unknown_id")
-            content = doc.page_content
+        for block in pack_context(query, results):
+            doc_id = ", ".join(block.doc_ids)
+            content = block.content
             prompt += f"[doc_id: {doc_id}]\n{content}\n\n"
             source_json.append({"doc_id": doc_id, "content": content})
 
@@ -116,27 +223,24 @@ class Agent_Service:
 
             # Normalize output to dict
             if isinstance(llm_result, dict):
-                raw_output = llm_result
+                parsed_result = ExtractedInsights.model_validate(llm_result)
             elif hasattr(llm_result, "content"):
-                raw_output = json.loads(llm_result.content.strip("json\n").strip())
+                parsed_result = parse_model(str(llm_result.content), ExtractedInsights)
             elif isinstance(llm_result, str):
-                raw_output = json.loads(llm_result.strip("json\n").strip())
+                parsed_result = parse_model(llm_result, ExtractedInsights)
             else:
                 raise ValueError("Unknown response format from LLM")
 
-            # Pydantic parser expects string input
-            parsed_result = parser.parse(json.dumps(raw_output))
-
         except Exception as e:
             print("❌ Error parsing JSON:", e)
             return {"result": str(llm_result), "source": source_json}
 
         return {"result": parsed_result.model_dump(), "source": source_json}
 
-    def build_extract_pdf_insights(self,thread_id:int=0):    
+    def build_extract_pdf_insights(self):    
             extract_pdf_insights = Tool(
                 name="extract_pdf_insights",
-                func=lambda query: self.explain_with_sources(query=query,thread_id=thread_id),
+                func=lambda query: self.explain_with_sources(query=query,thread_id=agent_thread_id.get()),
                 description=(
                     "Use this tool to answer ANY question about a company's PDF document. "
                     "If the question includes financial terms like 'revenue', 'profit', 'growth', 'FY2023', etc., "
@@ -145,24 +249,31 @@ class Agent_Service:
             )
             return extract_pdf_insights
     def build_repl_tool(self):
-        repl_tool = PythonREPLTool()
+        repl_tool = PythonREPLTool(python_repl=RequestREPL())
         return repl_tool
     
 
     def extract_excerpt_per_doc_id(self,doc_id:str,thread_id:int=0) -> str:
-        results = retriver.vectorstore.similarity_search_by_metadata(metadata={"doc_id": doc_id,"thread_id":thread_id}, k=3)
+        # the tool input comes from the LLM and may be quoted
+        results = retriver.get_excerpt(doc_id.strip().strip("'\""), thread_id=thread_id)
         if not results:
             return f"No content found on page {doc_id}"
         excerpts = [f"[doc_id{doc.metadata['doc_id']}]\n{doc.page_content}" for doc in results]
         return "\n\n".join(excerpts)
-    def build_page_excerpt_tool(self,thread_id:int=0):
+    def build_page_excerpt_tool(self):
         get_doc_id_excerpt = Tool(
             name="get_doc_id_excerpt",
-            func=lambda doc_id: self.extract_excerpt_per_doc_id(doc_id=doc_id,thread_id=thread_id),
+            func=lambda doc_id: self.extract_excerpt_per_doc_id(doc_id=doc_id,thread_id=agent_thread_id.get()),
             description="Use this to retrieve the full content of a specific document excerpt specifed by doc_id in the document."
         )
         return get_doc_id_excerpt
     def fix_output(self,output:str)->dict:
+        try:
+            return parse_model(output, FinancialOutput).model_dump()
+        except RepairError as e:
+            # only unrecoverable output costs another LLM call
+            print("local JSON repair failed, asking the LLM:", e)
+        json_repair.counters["fallback"] += 1
         try:
             parser = PydanticOutputParser(pydantic_object=FinancialOutput)
             fix_prompt_template = PromptTemplate(
@@ -188,10 +299,23 @@ class Agent_Service:
                 output_parser=parser
             )
             structured_output = refine_chain.run({"response": output})
-            return structured_output
+            return structured_output.model_dump()
         except Exception as e:
             print("error:", e)
             return f"error: {e}"
+    def get_main_agent(self):
+        """The langchain agent, built on first use and shared by every query of this service."""
+        with self._main_agent_lock:
+            if self.main_agent is None:
+                self.main_agent = initialize_agent(
+                    tools=[self.build_extract_pdf_insights(), self.build_page_excerpt_tool(), self.build_repl_tool()],
+                    llm=llm,
+                    agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+                    verbose=True,
+                    handle_parsing_errors=True,
+                    agent_kwargs={"prefix": MAIN_AGENT_PROMPT}
+                )
+            return self.main_agent
     def run_agent(self,query: str, thread_id: int,db:Session,thread_specific_call:bool=False)->dict:
         """
         Run the main agent of the financial insight agent
@@ -210,38 +334,9 @@ class Agent_Service:
             passing_id = thread_id
         else:
             passing_id = 0
-        tools_for_main_agent = [self.build_extract_pdf_insights(thread_id=passing_id), self.build_page_excerpt_tool(thread_id=passing_id), self.build_repl_tool()]
-        main_agent_prompt = """
-            You are a master financial analyst. Your job is to provide a comprehensive answer to the user's query by orchestrating specialized tools.
-            WORKFLOW:
-            1.  First, you MUST use the extract_pdf_insights tool to get the related data from the document.
-            2.  Review the explanation from the output of the first tool.
-            3.  For charts:
-                i.  Write Python code using plotly to create a chart.
-                ii.  Assign the chart to variable `fig`, convert to JSON using `fig.to_json()` and print it.
-            4.  Finally, synthesize the explanation and chart into a full answer.
-            pls finish this within 3 calls if more calls are needed return "I cannot answer this question, please try another one"
-            Final output format:
-            {
-            "text_explanation": "your explanation here",
-            "chart_json": "...plotly fig.to_json() string here...",
-            "table_json": {...}  // if not applicable, return null
-            }
-
-            ⚠️ DO NOT include markdown, HTML, or extra commentary — return only the JSON object.
-            ⚠️ If the answer can't be completed in 3 steps, respond with:
-            { "text_explanation": "I cannot answer this question, please try another one", "chart_json": null, "table_json": null }
-
-            Start!
-            """
-        main_agent = initialize_agent(
-                tools=tools_for_main_agent,
-                llm=llm,
-                agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-                verbose=True,
-                handle_parsing_errors=True,
-                agent_kwargs={"prefix": main_agent_prompt}
-            )
+        main_agent = self.get_main_agent()
+        agent_thread_id.set(passing_id)
+        agent_repl.set(PythonREPL())
         # runnable = RunnableWithMessageHistory(
         #      main_agent,
         #      lambda session_id: PostgresMessageHistory(db_manager=db, thread_id=session_id),
@@ -297,6 +392,15 @@ class State:
     chart_json:Optional[str]
     table_json:Optional[dict]
     thread_id:int
+    # (event, data) tuples for /query/stream, None when not streaming
+    events:Optional[asyncio.Queue] = None
+    # graph agent run started speculatively by RetriverAgent
+    chart_task:Optional[asyncio.Task] = None
+
+
+async def emit(state: State, event: str, data) -> None:
+    if state.events is not None:
+        await state.events.put((event, data))
 
 def execute_code(exec_code:str)->str:
     """exectues python code and returns value of the variable named fig_json
@@ -307,16 +411,8 @@ def execute_code(exec_code:str)->str:
     Returns:
         str: fig_json
     """
-    try:
-        locals = {}
-        exec(exec_code,{"px":px,"go":go,"pd":pd,"pio":pio},locals)
-        if("fig_json" in locals):
-            return locals.get("fig_json")
-        else:
-            raise Exception("fig_json not found")
-    except Exception as e:
-        print("error:", e)
-        return f"error: {e}"
+    # runs in a pooled worker process with a timeout and memory limit
+    return chart_executor.execute(exec_code)
 class summarizerResponse(BaseModel):
     text:str
     table_json:Optional[dict]
@@ -327,22 +423,32 @@ class graphResponse(BaseModel):
 @dataclass
 class RetriverAgent(BaseNode[State]):
     def get_context(self, query: str, thread_id: int = 0,k:int=10) -> tuple[str, list[dict]]:
-        results = retriver.retrive(query, thread_id=thread_id,k=k)
+        results = retriver.retrive_reranked(query, thread_id=thread_id,k=k)
         source_json = []
         prompt = ""
 
-        for doc in results:
-            metadata = doc.metadata
-            doc_id = metadata.get("doc_id", "unknown_id")
-            content = doc.page_content
-            page = metadata.get("page_number", "unknown_page")
-            prompt += f"[doc_id: {doc_id}] page: {page}\n\n{content}\n\n"  
+        for block in pack_context(query, results):
+            doc_id = ", ".join(block.doc_ids)
+            content = block.content
+            page = block.page_number if block.page_number is not None else "unknown_page"
+            prompt += f"[doc_id: {doc_id}] page: {page}\n\n{content}\n\n"
             source_json.append({"doc_id": doc_id, "content": content})
 
         return prompt.strip(), source_json
 
     async def run(self,ctx:GraphRunContext[State])->SummarizerAgent:
-        ctx.state.context, sources = self.get_context(ctx.state.user_query, thread_id=ctx.state.thread_id,k=5)
+        ctx.state.context, sources = await run_blocking(
+            self.get_context, ctx.state.user_query, thread_id=ctx.state.thread_id, k=5
+        )
+        await emit(ctx.state, "sources", sources)
+        if CHART_SPECULATION and wants_chart(ctx.state.user_query, ctx.state.context):
+            prompt = GraphAgent.build_prompt(
+                speculative_instructions(ctx.state.user_query, ctx.state.context)
+            )
+            # the task copies the context, so its LLM calls yield to interactive ones
+            with use_priority(PRIORITY_SPECULATIVE):
+                ctx.state.chart_task = asyncio.create_task(ctx.deps.graph_agent.run(prompt))
+            speculation_counters["started"] += 1
         return SummarizerAgent()
 @dataclass
 class SummarizerAgent(BaseNode[State]):
@@ -369,24 +475,63 @@ class SummarizerAgent(BaseNode[State]):
     
 
         """
+    async def stream_summary(self, ctx: GraphRunContext[State], prompt: str) -> summarizerResponse:
+        """Run the summarizer streamed, emitting text deltas as the output is parsed."""
+        sent = ""
+        async with ctx.deps.summarizer_agent.run_stream(prompt) as result:
+            async for partial_output in result.stream(debounce_by=0.05):
+                text = getattr(partial_output, "text", None) or ""
+                if len(text) > len(sent) and text.startswith(sent):
+                    await emit(ctx.state, "text", text[len(sent):])
+                    sent = text
+            output = await result.get_output()
+        if output.text.startswith(sent) and len(output.text) > len(sent):
+            await emit(ctx.state, "text", output.text[len(sent):])
+        return output
+
     async def run(self,ctx:GraphRunContext[State])->GraphAgent|End:
         prompt = self.get_prompt(ctx.state.user_query, ctx.state.context)
-        response = await ctx.deps.summarizer_agent.run(prompt)
-        ctx.state.text = response.output.text
-        ctx.state.table_json = response.output.table_json
-        is_graph_needed = response.output.is_graph_needed
-        return GraphAgent(instructions=response.output.graph_instructions) if is_graph_needed else End(ctx)
+        with use_priority(PRIORITY_INTERACTIVE):
+            if ctx.state.events is None:
+                output = (await ctx.deps.summarizer_agent.run(prompt)).output
+            else:
+                output = await self.stream_summary(ctx, prompt)
+        ctx.state.text = output.text
+        ctx.state.table_json = output.table_json
+        if output.table_json is not None:
+            await emit(ctx.state, "table", output.table_json)
+        is_graph_needed = output.is_graph_needed
+        if is_graph_needed and output.table_json:
+            # numeric tables are charted locally, without the graph LLM
+            chart_json = build_chart(
+                output.table_json,
+                hint=f"{output.graph_instructions} {ctx.state.user_query}",
+                title=ctx.state.user_query[:80],
+            )
+            if chart_json is not None:
+                ctx.state.chart_json = chart_json
+                await emit(ctx.state, "chart", chart_json)
+                is_graph_needed = False
+        if not is_graph_needed and ctx.state.chart_task is not None:
+            ctx.state.chart_task.cancel()
+            ctx.state.chart_task = None
+            speculation_counters["discarded"] += 1
+        return GraphAgent(instructions=output.graph_instructions) if is_graph_needed else End(ctx)
     
 @dataclass    
 class GraphAgent(BaseNode[State]):
     instructions:str
     def get_prompt(self) -> str:
+        return self.build_prompt(self.instructions)
+
+    @staticmethod
+    def build_prompt(instructions: str) -> str:
         prompt = f"""
         You are a viualizer agent, you are given a instructions to write a python plotly code to create a graph
         from the provided instructions using the plotly libary and using the repl tool using the tool call
         and ensure to return the plotly fig.to_json()
         and print it in the code genrated
-        instructions: {self.instructions}
+        instructions: {instructions}
 
         use the execute_code tool to execute the python code and return the fig_json
         You are a graph agent. You are given instructions to generate a Python code block using Plotly.
@@ -415,10 +560,30 @@ Do NOT use angle brackets, markdown, or pseudo-XML.
 
     """
         return prompt
+    async def speculative_chart(self, ctx: GraphRunContext[State]) -> Optional[str]:
+        """Result of the graph run started by RetriverAgent, None if it failed."""
+        task, ctx.state.chart_task = ctx.state.chart_task, None
+        try:
+            chart_json = (await task).output.graph_json
+        except Exception as e:
+            print("speculative chart failed:", e)
+            chart_json = None
+        if not chart_json or chart_json.startswith("error"):
+            speculation_counters["failed"] += 1
+            return None
+        speculation_counters["used"] += 1
+        return chart_json
+
     async def run(self,ctx:GraphRunContext[State])->End:
-        prompt = self.get_prompt()
-        response = await ctx.deps.graph_agent.run(prompt)
-        ctx.state.chart_json = response.output.graph_json
+        chart_json = None
+        if ctx.state.chart_task is not None:
+            chart_json = await self.speculative_chart(ctx)
+        if chart_json is None:
+            prompt = self.get_prompt()
+            response = await ctx.deps.graph_agent.run(prompt)
+            chart_json = response.output.graph_json
+        ctx.state.chart_json = chart_json
+        await emit(ctx.state, "chart", ctx.state.chart_json)
         return End(ctx.state)
     
 @dataclass        
@@ -427,16 +592,26 @@ class Deps():
     graph_agent:Agent
 
 class AgentRunner:
+    """Long-lived agent runtime of a worker.
+
+    The model, both agents, the graph and the deps are built once and shared
+    by every request; per request data only lives in the State of a run.
+    """
+
     def __init__(self, model_name: str, api_key: str):
-        self.model = OpenAIModel(
-            model_name=model_name,
-            provider=OpenAIProvider(
-                base_url="https://api.groq.com/openai/v1",
-                api_key=api_key,
-            ),
-        )
+        self.model = build_model(model_name, api_key)
         self.summarize_agent = self._create_summarizer_agent()
         self.graph_agent = self._create_graph_agent()
+        self.deps = Deps(summarizer_agent=self.summarize_agent, graph_agent=self.graph_agent)
+        self.graph = Graph(nodes=(RetriverAgent, SummarizerAgent, GraphAgent))
+        self.answer_cache = None
+        if ANSWER_CACHE == "on":
+            self.answer_cache = SemanticAnswerCache(
+                db_manager=retriver.db_instance,
+                embeddings=retriver.embedding_function,
+                threshold=ANSWER_CACHE_THRESHOLD,
+            )
+            retriver.add_thread_listener(self.answer_cache.invalidate_thread)
 
     def _create_summarizer_agent(self) -> Agent[summarizerResponse]:
         return Agent(
@@ -461,70 +636,76 @@ class AgentRunner:
             output_retries=3,
         )
 
-    async def run(self, user_query: str, thread_id: int = 0) -> dict:
+    async def run(self, user_query: str, thread_id: int = 0, events: Optional[asyncio.Queue] = None) -> dict:
+        """Answer a query.
+
+        Args:
+            events (asyncio.Queue | None): receives ("sources" | "text" | "table" |
+                "chart", data) tuples while the answer is produced, text as deltas
+        """
+        if self.answer_cache is not None:
+            cached = await run_blocking(self.answer_cache.lookup, user_query, thread_id)
+            if cached is not None:
+                if events is not None:
+                    await events.put(("text", cached["text"]))
+                    if cached["table_json"] is not None:
+                        await events.put(("table", cached["table_json"]))
+                    if cached["graph_json"] is not None:
+                        await events.put(("chart", cached["graph_json"]))
+                return cached
+
         state = State(
             user_query=user_query,
             context="",
             text="",
             chart_json=None,
             table_json=None,
-            thread_id=thread_id
-        )
-
-        deps = Deps(
-            summarizer_agent=self.summarize_agent,
-            graph_agent=self.graph_agent
+            thread_id=thread_id,
+            events=events,
         )
 
-        graph = Graph(nodes=(RetriverAgent(), SummarizerAgent, GraphAgent))
-        result = await graph.run(RetriverAgent(), state=state, deps=deps)
+        try:
+            result = await self.graph.run(RetriverAgent(), state=state, deps=self.deps)
+        finally:
+            # a speculative chart is left over when the summarizer failed
+            if state.chart_task is not None:
+                state.chart_task.cancel()
 
-        return {
+        answer = {
             "text": result.state.text,
             "table_json": result.state.table_json,
             "graph_json": result.state.chart_json
         }
-async def run_agent(user_query: str, thread_id: int = 0):
-    model = OpenAIModel(
-        
-        model_name=os.getenv("MODEL_TYPE", "none"),
-        provider=OpenAIProvider(
-            base_url="https://api.groq.com/openai/v1",
-            api_key=os.getenv("GROQ_API_KEY"),
-        ),
-    )
+        if self.answer_cache is not None:
+            await run_blocking(self.answer_cache.store, user_query, thread_id, answer)
+        return answer
 
-    summarize_agent:Agent[summarizerResponse]= Agent(
-        model=model,
-        system_prompt="You are a summarizer agent give insightful summary of the provided text and also if needed provide the table from the docuemnt excrpts and instructions to create a graph if needed",
-        output_type= summarizerResponse,
-        output_retries=3,
-    )
-    graph_agent:Agent[graphResponse]= Agent(
-        model=model,
-        system_prompt="You are a graph agent write a python plotly code to create a graph from the provided instructions using the plotly libary and use tool calling",
-        output_type= graphResponse,
-        tools= [Tool(execute_code,takes_ctx=False)],
-        output_retries=3,
-    )
-    state = State(user_query=user_query, context="", text="", chart_json=None, table_json=None, thread_id=thread_id)
-    graph = Graph(nodes=(RetriverAgent(),SummarizerAgent,GraphAgent))
-    deps = Deps(summarizer_agent=summarize_agent,graph_agent=graph_agent)
-    result = await graph.run(RetriverAgent(),
-                            state= state,
-                             deps=deps)
-    
+    def warm_up(self) -> None:
+        """Load what the first query would otherwise load lazily."""
+        context_packer.count_tokens("warm up")
+        if retriver.reranker is not None:
+            retriver.reranker.warm_up()
+
+
+_agent_runner: Optional[AgentRunner] = None
+_agent_runner_lock = threading.Lock()
+
+
+def get_agent_runner() -> AgentRunner:
+    """The AgentRunner of this worker, created on first use from MODEL_TYPE and GROQ_API_KEY."""
+    global _agent_runner
+    with _agent_runner_lock:
+        if _agent_runner is None:
+            _agent_runner = AgentRunner(model_name=os.getenv("MODEL_TYPE", "none"), api_key=os.getenv("GROQ_API_KEY"))
+        return _agent_runner
+
+
+async def run_agent(user_query: str, thread_id: int = 0):
+    answer_dict = await get_agent_runner().run(user_query, thread_id=thread_id)
     print("result is:")
-    print(result)
-    print(result.state.text)
-    answer_dict = {
-        "text": result.state.text,
-        "table_json": result.state.table_json,
-        "graph_json": result.state.chart_json if result.state.chart_json else None
-    }
+    print(answer_dict["text"])
     return answer_dict
 if __name__ == "__main__":
-    import asyncio
     from dotenv import load_dotenv
     load_dotenv(r"D:\projects\dtcc-i-h-2025-just-a-byte\.env")
     asyncio.run(run_agent("give me a summary of the document and some graph"))
\ No newline at end of file
@@ -0,0 +1,146 @@
+import re
+from typing import Optional
+
+import pandas as pd
+import plotly.graph_objects as go
+
+CHART_TYPES = ("bar", "line", "pie", "waterfall")
+HINT_PATTERNS = {
+    "waterfall": re.compile(r"\b(waterfall|bridge|walk)\b", re.IGNORECASE),
+    "pie": re.compile(r"\b(pie|donut|share|composition|split|proportion)\b", re.IGNORECASE),
+    "line": re.compile(r"\b(line|trend|over time|timeline|trajectory)\b", re.IGNORECASE),
+    "bar": re.compile(r"\b(bar|column|compare|comparison)\b", re.IGNORECASE),
+}
+PERIOD_LABEL = re.compile(r"^(fy|q[1-4]|h[12]|cy)?\s*'?\d{2,4}([-/]\d{2,4})?$", re.IGNORECASE)
+TOTAL_LABEL = re.compile(r"\b(total|net|closing|ending)\b", re.IGNORECASE)
+NUMBER_JUNK = re.compile(r"[,\s₹$€£]|(rs\.?|inr|usd|crores?|lakhs?|mn|million|bn|billion)$", re.IGNORECASE)
+
+counters = {"built": 0, "unsupported": 0}
+
+
+def to_number(value) -> Optional[float]:
+    """Parse table cells like "1,204", "(87)", "12.5%" or "₹ 4,512 crore"."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+    text = value.strip()
+    negative = text.startswith("(") and text.endswith(")")
+    text = NUMBER_JUNK.sub("", text.strip("()").rstrip("%"))
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return -number if negative else number
+
+
+def table_to_frame(table_json) -> Optional[pd.DataFrame]:
+    """DataFrame whose first column holds the labels, for the table shapes the summarizer returns."""
+    try:
+        return _table_to_frame(table_json)
+    except (ValueError, TypeError):
+        # ragged rows, header/row length mismatch, unhashable labels
+        return None
+
+
+def _table_to_frame(table_json) -> Optional[pd.DataFrame]:
+    if isinstance(table_json, dict) and len(table_json) == 1:
+        (only,) = table_json.values()
+        if isinstance(only, (list, dict)):
+            table_json = only
+    if isinstance(table_json, dict):
+        columns = table_json.get("columns") or table_json.get("headers")
+        rows = table_json.get("data") or table_json.get("rows")
+        if columns and isinstance(rows, list):
+            return pd.DataFrame(rows, columns=columns)
+        if rows and isinstance(rows, list) and isinstance(rows[0], dict):
+            return pd.DataFrame(rows)
+        values = list(table_json.values())
+        if values and all(isinstance(value, dict) for value in values):
+            # {"Revenue": {"FY23": 1, "FY24": 2}, ...}
+            return pd.DataFrame(table_json).reset_index()
+        if values and all(isinstance(value, list) for value in values):
+            # {"Year": [...], "Revenue": [...]}
+            if len({len(value) for value in values}) != 1:
+                return None
+            return pd.DataFrame(table_json)
+        if values and all(to_number(value) is not None for value in values):
+            return pd.DataFrame({"label": list(table_json), "value": values})
+        return None
+    if isinstance(table_json, list) and table_json:
+        if all(isinstance(row, dict) for row in table_json):
+            return pd.DataFrame(table_json)
+        if all(isinstance(row, list) for row in table_json):
+            return pd.DataFrame(table_json[1:], columns=table_json[0])
+    return None
+
+
+def numeric_series(frame: pd.DataFrame) -> tuple[list[str], dict[str, list[float]]]:
+    """Labels and every column whose cells all parse as numbers."""
+    labels = [str(label) for label in frame.iloc[:, 0]]
+    series = {}
+    for column in frame.columns[1:]:
+        values = [to_number(value) for value in frame[column]]
+        if all(value is not None for value in values):
+            series[str(column)] = values
+    return labels, series
+
+
+def pick_chart_type(hint: str, labels: list[str]) -> str:
+    for chart_type in ("waterfall", "pie", "line", "bar"):
+        if HINT_PATTERNS[chart_type].search(hint):
+            return chart_type
+    if len(labels) >= 3 and all(PERIOD_LABEL.match(label.strip()) for label in labels):
+        return "line"
+    return "bar"
+
+
+def build_chart(table_json, hint: str = "", title: str = "") -> Optional[str]:
+    """Plotly figure JSON for numeric table data, None when the table can't be charted.
+
+    Args:
+        table_json: table returned by the summarizer
+        hint (str): graph instructions / query, used to choose bar, line, pie or waterfall
+        title (str): chart title
+    """
+    frame = table_to_frame(table_json)
+    if frame is None or len(frame) < 2 or len(frame.columns) < 2:
+        counters["unsupported"] += 1
+        return None
+    labels, series = numeric_series(frame)
+    if not series:
+        # the label column may be on the right, e.g. {"value": .., "year": ..}
+        frame = frame[frame.columns[::-1]]
+        labels, series = numeric_series(frame)
+    if not series:
+        counters["unsupported"] += 1
+        return None
+
+    chart_type = pick_chart_type(hint, labels)
+    if chart_type in ("pie", "waterfall") and len(series) > 1:
+        chart_type = "bar"
+    first = next(iter(series.values()))
+    if chart_type == "pie" and any(value < 0 for value in first):
+        chart_type = "bar"
+
+    fig = go.Figure()
+    if chart_type == "pie":
+        fig.add_trace(go.Pie(labels=labels, values=first))
+    elif chart_type == "waterfall":
+        measures = [
+            "total" if i == len(labels) - 1 and TOTAL_LABEL.search(label) else "relative"
+            for i, label in enumerate(labels)
+        ]
+        fig.add_trace(go.Waterfall(x=labels, y=first, measure=measures))
+    else:
+        for name, values in series.items():
+            if chart_type == "line":
+                fig.add_trace(go.Scatter(x=labels, y=values, name=name, mode="lines+markers"))
+            else:
+                fig.add_trace(go.Bar(x=labels, y=values, name=name))
+        fig.update_layout(xaxis_title=str(frame.columns[0]), barmode="group")
+    fig.update_layout(title=title, showlegend=len(series) > 1 or chart_type == "pie")
+    counters["built"] += 1
+    return fig.to_json()
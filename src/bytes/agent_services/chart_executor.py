@@ -0,0 +1,265 @@
+import json
+import os
+import queue
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows, no rlimits
+    resource = None
+
+WORKER_MODULE = "bytes.agent_services.chart_executor"
+# the only variables a worker gets, the server's secrets (GROQ_API_KEY,
+# DB_PASSWORD, SECRET_KEY, ...) never reach the process, not even /proc/self/environ
+WORKER_ENV_KEYS = ("PATH", "SYSTEMROOT", "TEMP", "TMP", "LANG", "LC_ALL")
+HEADER = struct.Struct(">I")
+
+
+def worker_env() -> dict:
+    env = {key: os.environ[key] for key in WORKER_ENV_KEYS if key in os.environ}
+    # import bytes and the plotting libraries from wherever the server does
+    env["PYTHONPATH"] = os.pathsep.join(path or os.getcwd() for path in sys.path)
+    env["OPENBLAS_NUM_THREADS"] = "1"
+    return env
+
+
+def write_message(stream, message) -> None:
+    # JSON, not pickle: the parent must not unpickle what LLM written code can write
+    data = json.dumps(message).encode("utf-8")
+    stream.write(HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+def read_message(stream):
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise EOFError("chart worker pipe closed")
+    (size,) = HEADER.unpack(header)
+    data = stream.read(size)
+    if len(data) < size:
+        raise EOFError("chart worker pipe closed")
+    return json.loads(data)
+
+
+def worker_main(memory_mb: int) -> None:
+    """Chart worker: imports plotting libraries once, then runs snippets read from stdin until told to stop."""
+    requests = sys.stdin.buffer
+    # replies go to the original stdout, prints of the snippets to stderr
+    replies = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    import pandas as pd
+    import plotly.express as px
+    import plotly.graph_objects as go
+    import plotly.io as pio
+
+    # build one figure so plotly's lazily imported validators are loaded too
+    go.Figure(go.Bar(x=[0], y=[0])).to_json()
+    if resource is not None and memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    while True:
+        try:
+            code = read_message(requests)
+        except (EOFError, KeyboardInterrupt):
+            return
+        if code is None:
+            return
+        try:
+            local_vars = {}
+            exec(code, {"px": px, "go": go, "pd": pd, "pio": pio}, local_vars)
+            if "fig_json" in local_vars:
+                result = ("ok", str(local_vars["fig_json"]))
+            elif "fig" in local_vars:
+                result = ("ok", local_vars["fig"].to_json())
+            else:
+                result = ("error", "fig_json not found")
+        except MemoryError:
+            result = ("memory", f"exceeded the {memory_mb} MB memory limit")
+        except BaseException as e:
+            result = ("error", f"{type(e).__name__}: {e}")
+        write_message(replies, result)
+
+
+class _Worker:
+    """A worker process started with a minimal, explicit environment."""
+
+    def __init__(self, memory_mb: int) -> None:
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", WORKER_MODULE, str(memory_mb)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=worker_env(),
+            close_fds=True,
+        )
+        self.results: queue.Queue = queue.Queue()
+        threading.Thread(target=self._read, daemon=True, name="chart-worker-reader").start()
+        self.jobs = 0
+
+    def _read(self) -> None:
+        try:
+            while True:
+                self.results.put(read_message(self.process.stdout))
+        except (EOFError, OSError, ValueError):
+            self.results.put(None)
+
+    def run(self, code: str, timeout: float) -> tuple[str, str]:
+        try:
+            write_message(self.process.stdin, code)
+        except (BrokenPipeError, OSError):
+            return "crashed", "chart worker exited"
+        try:
+            result = self.results.get(timeout=timeout)
+        except queue.Empty:
+            return "timeout", f"timed out after {timeout}s"
+        if result is None:
+            return "crashed", "chart worker exited"
+        if not isinstance(result, list) or len(result) != 2:
+            return "crashed", "chart worker sent an invalid reply"
+        status, payload = result
+        return str(status), str(payload)
+
+    def stop(self) -> None:
+        try:
+            write_message(self.process.stdin, None)
+        except (BrokenPipeError, OSError):
+            pass
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.close()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.close()
+
+    def close(self) -> None:
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class ChartExecutor:
+    """Runs LLM written plotly code in a pool of pre-warmed worker processes.
+
+    Every call has a wall clock timeout, after which the worker is killed,
+    and workers run under an address space limit, started with only the
+    variables in WORKER_ENV_KEYS. This contains runaway snippets and keeps
+    secrets out of the workers, it is not a sandbox: the code still runs
+    with full builtins as the server's user. Workers are replaced in
+    the background after max_jobs calls, a timeout, a crash or a
+    MemoryError, so a bad snippet never blocks the next caller for longer
+    than it takes to get an idle worker.
+    """
+
+    def __init__(self, workers: int = 2, timeout: float = 10.0, memory_mb: int = 1024, max_jobs: int = 50) -> None:
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.max_jobs = max_jobs
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        self._all: set[_Worker] = set()
+        self._lock = threading.Lock()
+        self._started = False
+        self.counters = {
+            "jobs": 0, "errors": 0, "timeouts": 0, "memory_errors": 0,
+            "crashes": 0, "recycled": 0, "unavailable": 0, "waiting": 0, "seconds": 0.0,
+        }
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.workers):
+            self._spawn()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            workers, self._all = list(self._all), set()
+            self._started = False
+        for worker in workers:
+            worker.stop()
+        self._idle = queue.Queue()
+
+    def _spawn(self) -> None:
+        worker = _Worker(self.memory_mb)
+        with self._lock:
+            self._all.add(worker)
+        self._idle.put(worker)
+
+    def _replace(self, worker: _Worker) -> None:
+        with self._lock:
+            self._all.discard(worker)
+            self.counters["recycled"] += 1
+        worker.kill()
+        # spawning takes a moment (plotly/pandas imports), don't make the caller wait
+        threading.Thread(target=self._respawn, daemon=True, name="chart-worker-spawn").start()
+
+    def _respawn(self) -> None:
+        try:
+            self._spawn()
+        except Exception as e:
+            # the pool runs one worker short, callers time out instead of waiting forever
+            print("chart worker respawn failed:", e)
+
+    def _count(self, **increments) -> None:
+        with self._lock:
+            for name, value in increments.items():
+                self.counters[name] += value
+
+    def execute(self, code: str) -> str:
+        """Run a snippet that assigns fig_json (or fig), returns the figure json or "error: ..."."""
+        self.start()
+        self._count(waiting=1)
+        try:
+            worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            # every worker busy, or none came back after a respawn or shutdown
+            self._count(waiting=-1, errors=1, unavailable=1)
+            print("chart execution failed: no chart worker available")
+            return f"error: no chart worker available within {self.timeout}s"
+        self._count(waiting=-1)
+        start = time.perf_counter()
+        status, payload = worker.run(code, self.timeout)
+        worker.jobs += 1
+
+        self._count(
+            jobs=1,
+            seconds=time.perf_counter() - start,
+            errors=int(status != "ok"),
+            timeouts=int(status == "timeout"),
+            memory_errors=int(status == "memory"),
+            crashes=int(status == "crashed"),
+        )
+        if status in ("timeout", "memory", "crashed") or worker.jobs >= self.max_jobs:
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+        if status != "ok":
+            print("chart execution failed:", payload)
+            return f"error: {payload}"
+        return payload
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            counters["workers"] = len(self._all)
+        seconds = counters.pop("seconds")
+        counters["idle"] = self._idle.qsize()
+        counters["queue_depth"] = counters.pop("waiting")
+        counters["avg_ms"] = round(seconds / counters["jobs"] * 1000, 2) if counters["jobs"] else 0.0
+        return counters
+
+
+if __name__ == "__main__":
+    worker_main(int(sys.argv[1]))
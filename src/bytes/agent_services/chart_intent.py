@@ -0,0 +1,38 @@
+import re
+
+# words that ask for a visual outright
+EXPLICIT_CHART_WORDS = re.compile(
+    r"\b(chart|graph|plot|visuali[sz]e|visuali[sz]ation|diagram|pie|bar|histogram|waterfall)s?\b",
+    re.IGNORECASE,
+)
+# words that usually end up as a chart when the context has figures
+COMPARISON_WORDS = re.compile(
+    r"\b(trend|trends|compare|comparison|versus|vs\.?|breakdown|distribution|split|share|"
+    r"over the (last|past) \w+ (years|quarters)|year on year|yoy|quarterly|growth)\b",
+    re.IGNORECASE,
+)
+NUMBER = re.compile(r"(?<![\w.])\d[\d,]*(\.\d+)?%?")
+# figures the context needs for a comparison question to be charted
+MIN_CONTEXT_NUMBERS = 4
+
+
+def wants_chart(query: str, context: str = "") -> bool:
+    """Cheap guess whether the summarizer will ask for a chart.
+
+    Explicit requests ("plot", "bar chart") always count, comparison
+    phrasing only when the retrieved context has enough figures to draw.
+    """
+    if EXPLICIT_CHART_WORDS.search(query):
+        return True
+    if COMPARISON_WORDS.search(query):
+        return len(NUMBER.findall(context)) >= MIN_CONTEXT_NUMBERS
+    return False
+
+
+def speculative_instructions(query: str, context: str) -> str:
+    """Graph instructions used before the summarizer has written its own."""
+    return (
+        f"Create the chart that best answers: {query}\n"
+        "Use only figures that appear in these document excerpts, label the axes "
+        f"and units, and title the chart.\n\n{context}"
+    )
@@ -0,0 +1,133 @@
+import base64
+import json
+import sys
+from array import array
+from typing import Optional
+
+PAYLOAD_FORMAT = "bytes-chart/1"
+# numeric arrays shorter than this are smaller as plain JSON
+MIN_ENCODED_LENGTH = 8
+INT32_RANGE = (-(2**31), 2**31 - 1)
+
+_template_jsons: Optional[dict[str, dict]] = None
+
+
+def template_jsons() -> dict[str, dict]:
+    """Plotly's built-in templates as they appear in fig.to_json(), by name."""
+    global _template_jsons
+    if _template_jsons is None:
+        import plotly.graph_objects as go
+        import plotly.io as pio
+
+        # encoded the same way fig.to_json() encodes them, so they compare equal
+        _template_jsons = {
+            name: json.loads(go.Figure(layout={"template": name}).to_json())["layout"]["template"]
+            for name in pio.templates
+        }
+    return _template_jsons
+
+
+def template_json(name: str) -> Optional[dict]:
+    return template_jsons().get(name)
+
+
+def narrowest_array(values: list) -> tuple[array, str]:
+    """Smallest typed array holding the values without loss."""
+    if all(isinstance(value, int) for value in values):
+        low, high = min(values), max(values)
+        for typecode, dtype, bits in (("b", "i1", 8), ("h", "i2", 16), ("i", "i4", 32)):
+            if -(2 ** (bits - 1)) <= low and high < 2 ** (bits - 1):
+                return array(typecode, values), dtype
+    single = array("f", values)
+    if list(single) == [float(value) for value in values]:
+        return single, "f4"
+    return array("d", values), "f8"
+
+
+def is_numeric(values: list) -> bool:
+    return all(
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+        and not (isinstance(value, int) and not INT32_RANGE[0] <= value <= INT32_RANGE[1])
+        for value in values
+    )
+
+
+def encode_array(values: list):
+    """Plotly typed array spec ({"dtype", "bdata"}) for numeric lists when it is smaller, else the list.
+
+    A rectangular list of numeric rows (heatmap z) becomes one spec with a
+    "rows, cols" shape, as plotly.py writes 2D arrays; plotly.js does not
+    decode specs nested inside lists.
+    """
+    shape = None
+    flat = values
+    if values and all(isinstance(row, list) for row in values):
+        columns = len(values[0])
+        if not columns or any(len(row) != columns for row in values):
+            return values
+        shape = f"{len(values)}, {columns}"
+        flat = [value for row in values for value in row]
+    if len(flat) < MIN_ENCODED_LENGTH or not is_numeric(flat):
+        return values
+    packed, dtype = narrowest_array(flat)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    encoded = {"dtype": dtype, "bdata": base64.b64encode(packed.tobytes()).decode("ascii")}
+    if shape is not None:
+        encoded["shape"] = shape
+    if len(json.dumps(encoded)) >= len(json.dumps(values)):
+        return values
+    return encoded
+
+
+def encode_arrays(node):
+    if isinstance(node, dict):
+        return {key: encode_arrays(value) for key, value in node.items()}
+    if isinstance(node, list):
+        encoded = encode_array(node)
+        if encoded is not node:
+            return encoded
+        # only attribute level arrays may be specs, nested rows stay plain JSON
+        return [encode_arrays(value) if isinstance(value, dict) else value for value in node]
+    return node
+
+
+def compact_chart(chart):
+    """Compact payload of a fig.to_json() chart.
+
+    Traces keep their attributes but numeric arrays become base64 typed
+    arrays, and a built-in template is replaced by its name, the frontend
+    fetches it once from /chart-templates/{name}. Anything that is not a
+    figure (None, "error: ...", an already compact payload) is returned as is.
+    """
+    if isinstance(chart, str):
+        try:
+            figure = json.loads(chart)
+        except ValueError:
+            return chart
+    else:
+        figure = chart
+    if not isinstance(figure, dict) or "data" not in figure or figure.get("format") == PAYLOAD_FORMAT:
+        return chart
+
+    layout = dict(figure.get("layout") or {})
+    template = layout.pop("template", None)
+    template_name = None
+    if template is not None:
+        template_name = next(
+            (name for name, known in template_jsons().items() if known == template), None
+        )
+        if template_name is None:
+            # a custom template stays inline
+            layout["template"] = template
+    return {
+        "format": PAYLOAD_FORMAT,
+        "data": encode_arrays(figure["data"]),
+        "layout": layout,
+        "template": template_name,
+    }
+
+
+def payload_size(chart) -> int:
+    """Bytes the chart takes inside a JSON encoded chat message."""
+    return len(json.dumps(chart).encode("utf-8")) if chart is not None else 0
@@ -0,0 +1,235 @@
+import json
+import re
+from typing import Optional, TypeVar, Union, get_args
+
+from pydantic import BaseModel, ValidationError
+
+FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+NUMBER_CHARS = set("0123456789+-.eE")
+VALUE_FOLLOWERS = set(",:}]")
+WORDS = {
+    "true": "true", "True": "true", "false": "false", "False": "false",
+    "null": "null", "None": "null", "undefined": "null", "NaN": "null",
+}
+ESCAPES = set('"\\/bfnrtu')
+
+counters = {"parsed": 0, "repaired": 0, "fallback": 0, "failed": 0}
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+class RepairError(ValueError):
+    """The text holds no JSON object that can be recovered."""
+
+
+def extract_candidate(text: str) -> str:
+    """The JSON part of an LLM reply: inside a code fence if there is one, from the first { on."""
+    fenced = FENCE.search(text)
+    if fenced and "{" in fenced.group(1):
+        text = fenced.group(1)
+    start = text.find("{")
+    if start == -1:
+        raise RepairError("no JSON object in the output")
+    return text[start:]
+
+
+def _next_significant(text: str, i: int) -> str:
+    while i < len(text) and text[i].isspace():
+        i += 1
+    return text[i] if i < len(text) else ""
+
+
+def _embedded_end(text: str, start: int) -> Optional[int]:
+    """End of the balanced object/array at start, None if it is not plain unescaped JSON."""
+    depth = 0
+    i = start
+    while i < len(text):
+        ch = text[i]
+        if ch == "\\":
+            return None
+        if ch == '"':
+            i += 1
+            while i < len(text) and text[i] != '"':
+                i += 2 if text[i] == "\\" else 1
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    return None
+
+
+def _read_string(text: str, i: int) -> tuple[str, int]:
+    """JSON encoded string starting at the quote at i, and the index after it."""
+    quote = text[i]
+    if quote == '"' and text[i + 1:i + 2] in ("{", "["):
+        # chart JSON pasted into a string without escaping its quotes
+        end = _embedded_end(text, i + 1)
+        if end is not None and _next_significant(text, end + 1) == quote:
+            embedded = text[i + 1:end + 1]
+            try:
+                json.loads(embedded)
+            except ValueError:
+                pass
+            else:
+                return json.dumps(embedded), text.index(quote, end + 1) + 1
+
+    chars = []
+    i += 1
+    while i < len(text):
+        ch = text[i]
+        if ch == "\\" and i + 1 < len(text):
+            escaped = text[i + 1]
+            if escaped == "'":
+                chars.append("'")
+            elif escaped in ESCAPES:
+                chars.append(ch + escaped)
+            else:
+                chars.append("\\\\" + escaped)
+            i += 2
+            continue
+        if ch == quote and (_next_significant(text, i + 1) in VALUE_FOLLOWERS or not _next_significant(text, i + 1)):
+            return '"' + "".join(chars) + '"', i + 1
+        if ch == '"' or ch == quote:
+            # a quote inside the text, not the end of the string
+            chars.append('\\"' if ch == '"' else ch)
+        elif ch == "\n":
+            chars.append("\\n")
+        elif ch == "\t":
+            chars.append("\\t")
+        elif ch == "\r":
+            chars.append("\\r")
+        else:
+            chars.append(ch)
+        i += 1
+    # truncated inside the string
+    return '"' + "".join(chars) + '"', i
+
+
+def _strip_trailing_comma(out: list[str]) -> None:
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def repair(text: str) -> str:
+    """Best effort valid JSON for the object at the start of text.
+
+    Handles single quotes, trailing commas, Python literals, bare words,
+    unescaped quotes and newlines in strings, comments, text after the
+    object and replies cut off mid-object.
+    """
+    out: list[str] = []
+    stack: list[str] = []
+    # whether the last string emitted was an object key still waiting for its value
+    pending_key = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if ch in "\"'":
+            encoded, i = _read_string(text, i)
+            previous = next((token for token in reversed(out) if not token.isspace()), "")
+            pending_key = bool(stack) and stack[-1] == "}" and previous in ("{", ",")
+            out.append(encoded)
+            continue
+        if ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            if stack and stack[-1] == ch:
+                _strip_trailing_comma(out)
+                stack.pop()
+                out.append(ch)
+                if not stack:
+                    break
+        elif ch == "/" and text.startswith("//", i):
+            newline = text.find("\n", i)
+            i = len(text) if newline == -1 else newline
+            continue
+        elif ch.isdigit() or ch == "-":
+            start = i
+            while i < len(text) and text[i] in NUMBER_CHARS:
+                i += 1
+            out.append(text[start:i])
+            pending_key = False
+            continue
+        elif ch.isalpha() or ch == "_":
+            start = i
+            while i < len(text) and (text[i].isalnum() or text[i] == "_"):
+                i += 1
+            word = text[start:i]
+            out.append(WORDS.get(word, json.dumps(word)))
+            continue
+        elif ch == ":":
+            pending_key = False
+            out.append(ch)
+        else:
+            out.append(ch)
+        i += 1
+
+    if stack:
+        # cut off: drop a dangling comma, give a dangling key a value, close what is open
+        _strip_trailing_comma(out)
+        if out and out[-1] == ":":
+            out.append("null")
+        elif pending_key:
+            out.append(":null")
+        out.extend(reversed(stack))
+    return "".join(out)
+
+
+def loads(text: str) -> tuple[Union[dict, list], bool]:
+    """Parse the JSON object in an LLM reply, returns (value, whether it needed repair)."""
+    candidate = extract_candidate(text)
+    try:
+        return json.loads(candidate), False
+    except ValueError:
+        pass
+    try:
+        value, _ = json.JSONDecoder().raw_decode(candidate)
+        return value, False
+    except ValueError:
+        pass
+    try:
+        return json.loads(repair(candidate)), True
+    except ValueError as e:
+        raise RepairError(f"could not repair the output: {e}") from e
+
+
+def coerce_fields(data: dict, model: type[BaseModel]) -> dict:
+    """Fit common LLM deviations to the model: objects for string fields, strings for dict fields, missing optionals."""
+    data = dict(data)
+    for name, field in model.model_fields.items():
+        types = get_args(field.annotation) or (field.annotation,)
+        if name not in data:
+            if type(None) in types:
+                data[name] = None
+            continue
+        value = data[name]
+        if str in types and isinstance(value, (dict, list)):
+            # chart JSON returned as an object instead of fig.to_json()
+            data[name] = json.dumps(value)
+        elif dict in types and isinstance(value, str):
+            try:
+                parsed, _ = loads(value)
+            except RepairError:
+                parsed = None
+            data[name] = parsed if isinstance(parsed, dict) else None
+    return data
+
+
+def parse_model(text: str, model: type[ModelT]) -> ModelT:
+    """Validated model from an LLM reply, repairing the JSON locally. Raises RepairError."""
+    try:
+        data, repaired = loads(text)
+        if not isinstance(data, dict):
+            raise RepairError("output is not a JSON object")
+        result = model.model_validate(coerce_fields(data, model))
+    except (RepairError, ValidationError) as e:
+        counters["failed"] += 1
+        raise RepairError(str(e)) from e
+    counters["repaired" if repaired else "parsed"] += 1
+    return result
@@ -0,0 +1,295 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.groq.com/openai/v1")
+# client side budgets, 0 leaves pacing to the provider's 429s
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+
+# lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_SPECULATIVE = 2
+llm_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=PRIORITY_NORMAL)
+
+# completion tokens assumed when a request sets no max_tokens
+DEFAULT_COMPLETION_TOKENS = 512
+CHARS_PER_TOKEN = 4
+
+
+@contextmanager
+def use_priority(priority: int):
+    """Scheduling priority of the LLM calls made (or tasks created) in this block."""
+    token = llm_priority.set(priority)
+    try:
+        yield
+    finally:
+        llm_priority.reset(token)
+
+
+class TokenBucket:
+    """Refills per_minute units per minute up to a burst of capacity, unlimited when per_minute is 0."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.available = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount units are available, 0 if they are now."""
+        if not self.rate:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.rate:
+            self.available -= min(amount, self.capacity)
+
+
+class LLMScheduler:
+    """Client-side pacing for one LLM provider, shared by every agent of the worker.
+
+    Requests get a slot in priority order (at most max_concurrency at a
+    time, held until the response body is closed), then wait until the
+    requests/min and tokens/min buckets allow them. A 429 pauses all requests for its Retry-After. Runs on the
+    event loop only, so no locking is needed.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        max_concurrency: int = 4,
+        max_retries: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+    ) -> None:
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.active = 0
+        self.paused_until = 0.0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self.counters = {
+            "requests": 0, "queued": 0, "retries": 0, "rate_limited": 0,
+            "server_errors": 0, "failed": 0, "wait_seconds": 0.0,
+        }
+
+    async def acquire(self, priority: int, tokens: int) -> None:
+        start = time.monotonic()
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+        else:
+            self.counters["queued"] += 1
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                # the slot may have been handed over just before the cancel
+                if future.done() and not future.cancelled():
+                    self.release()
+                raise
+        try:
+            while True:
+                wait = max(
+                    self.paused_until - time.monotonic(),
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(tokens),
+                )
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+        except BaseException:
+            self.release()
+            raise
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self.counters["requests"] += 1
+        self.counters["wait_seconds"] += time.monotonic() - start
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # hand the slot over, active stays the same
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def retry_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        # full jitter exponential backoff
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def stats(self) -> dict:
+        counters = dict(self.counters)
+        counters["wait_seconds"] = round(counters["wait_seconds"], 3)
+        counters["active"] = self.active
+        counters["queue_depth"] = sum(1 for _, _, future in self._waiters if not future.done())
+        return counters
+
+
+def estimate_tokens(request: httpx.Request) -> int:
+    """Prompt tokens (by characters) plus the requested completion budget."""
+    try:
+        body = json.loads(request.content or b"{}")
+    except ValueError:
+        return DEFAULT_COMPLETION_TOKENS
+    prompt_chars = len(json.dumps(body.get("messages", []))) + len(json.dumps(body.get("tools", [])))
+    completion = body.get("max_completion_tokens") or body.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+    return prompt_chars // CHARS_PER_TOKEN + completion
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class SlotStream(httpx.AsyncByteStream):
+    """Response body that gives the scheduler slot back when it is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release) -> None:
+        self.stream = stream
+        self.release = release
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self.stream.aclose()
+        finally:
+            self.release()
+
+
+class ScheduledTransport(httpx.AsyncBaseTransport):
+    """httpx transport that paces requests through an LLMScheduler and retries 429/5xx."""
+
+    def __init__(self, scheduler: LLMScheduler, transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        self.scheduler = scheduler
+        self.transport = transport or httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=max(scheduler.max_concurrency * 2, 10), max_keepalive_connections=10)
+        )
+
+    def _releaser(self):
+        """Releases one acquired slot, however often it is called."""
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.scheduler.release()
+
+        return release
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        priority = llm_priority.get()
+        tokens = estimate_tokens(request)
+        attempt = 0
+        while True:
+            await self.scheduler.acquire(priority, tokens)
+            release = self._releaser()
+            try:
+                response = await self.transport.handle_async_request(request)
+            except httpx.TransportError:
+                release()
+                if attempt >= self.scheduler.max_retries:
+                    self.scheduler.counters["failed"] += 1
+                    raise
+                response = None
+            except BaseException:
+                release()
+                raise
+            if response is not None:
+                # streamed bodies (run_stream) keep the slot until they are read and closed
+                response = httpx.Response(
+                    status_code=response.status_code,
+                    headers=response.headers,
+                    stream=SlotStream(response.stream, release),
+                    extensions=response.extensions,
+                )
+            if response is not None and response.status_code != 429 and response.status_code < 500:
+                return response
+            if attempt >= self.scheduler.max_retries:
+                self.scheduler.counters["failed"] += 1
+                return response
+
+            retry_after = None
+            if response is not None:
+                retry_after = retry_after_seconds(response)
+                await response.aclose()
+                if response.status_code == 429:
+                    self.scheduler.counters["rate_limited"] += 1
+                    # everyone backs off, not only this request
+                    self.scheduler.pause(retry_after if retry_after is not None else self.scheduler.base_delay)
+                else:
+                    self.scheduler.counters["server_errors"] += 1
+            delay = self.scheduler.retry_delay(attempt, retry_after)
+            self.scheduler.counters["retries"] += 1
+            print(
+                f"LLM request got {response.status_code if response is not None else 'a transport error'}, "
+                f"retry {attempt + 1}/{self.scheduler.max_retries} in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+llm_scheduler = LLMScheduler(
+    requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    max_retries=LLM_MAX_RETRIES,
+)
+# one pooled client for every agent of the worker
+llm_http_client = httpx.AsyncClient(
+    transport=ScheduledTransport(llm_scheduler),
+    timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=10.0),
+)
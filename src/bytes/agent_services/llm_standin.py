@@ -0,0 +1,147 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import deque
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def sample_value(schema: dict):
+    """Smallest value matching a JSON schema, enough for pydantic-ai to validate."""
+    if "anyOf" in schema:
+        options = schema["anyOf"]
+        null = next((option for option in options if option.get("type") == "null"), None)
+        return None if null is not None else sample_value(options[0])
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: sample_value(prop) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return []
+    if kind == "string":
+        return "stand-in answer"
+    if kind in ("integer", "number"):
+        return 0
+    if kind == "boolean":
+        return False
+    return None
+
+
+def resolve_refs(schema, defs: dict):
+    if isinstance(schema, dict):
+        if "$ref" in schema:
+            return resolve_refs(defs[schema["$ref"].split("/")[-1]], defs)
+        return {key: resolve_refs(value, defs) for key, value in schema.items()}
+    if isinstance(schema, list):
+        return [resolve_refs(value, defs) for value in schema]
+    return schema
+
+
+def completion_message(body: dict) -> dict:
+    """Assistant message answering with the final_result tool when there is one, else text."""
+    tool = next(
+        (
+            tool["function"]
+            for tool in body.get("tools", [])
+            if tool.get("function", {}).get("name", "").startswith("final_result")
+        ),
+        None,
+    )
+    if tool is None:
+        return {"role": "assistant", "content": "stand-in answer"}
+    parameters = tool.get("parameters", {})
+    arguments = sample_value(resolve_refs(parameters, parameters.get("$defs", {})))
+    return {
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [
+            {
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": tool["name"], "arguments": json.dumps(arguments)},
+            }
+        ],
+    }
+
+
+def create_app(requests_per_minute: int = 30, failure_rate: float = 0.05, latency: float = 0.5) -> FastAPI:
+    """OpenAI compatible /chat/completions stand-in with a provider like rate limit.
+
+    Answers 429 with Retry-After above requests_per_minute (sliding window),
+    503 for a failure_rate fraction of requests, otherwise a schema valid
+    reply after latency seconds. Used to exercise the LLM scheduler locally.
+    """
+    app = FastAPI(title="LLM stand-in")
+    window: deque[float] = deque()
+    counters = {"requests": 0, "rate_limited": 0, "failed": 0, "ok": 0}
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        counters["requests"] += 1
+        now = time.monotonic()
+        while window and now - window[0] >= 60:
+            window.popleft()
+        if len(window) >= requests_per_minute:
+            counters["rate_limited"] += 1
+            retry_after = 60 - (now - window[0])
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after": f"{retry_after:.2f}"},
+            )
+        window.append(now)
+        if random.random() < failure_rate:
+            counters["failed"] += 1
+            return JSONResponse({"error": {"message": "Service unavailable"}}, status_code=503)
+
+        await asyncio.sleep(latency)
+        counters["ok"] += 1
+        message = completion_message(body)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        usage = {"prompt_tokens": len(json.dumps(body.get("messages", []))) // 4, "completion_tokens": 16}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model", "stand-in"),
+                "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}],
+                "usage": usage,
+            }
+
+        def chunk(delta: dict, finish_reason=None, **extra) -> str:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model", "stand-in"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            return f"data: {json.dumps(data)}\n\n"
+
+        async def stream():
+            if message.get("tool_calls"):
+                call = message["tool_calls"][0]
+                yield chunk({"role": "assistant", "tool_calls": [{"index": 0, **call}]})
+                yield chunk({}, "tool_calls", usage=usage)
+            else:
+                yield chunk({"role": "assistant", "content": message["content"]})
+                yield chunk({}, "stop", usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    return app
@@ -1,16 +1,25 @@
+import asyncio
 import os
+import time
 from logging import getLogger
-from bytes.agent_services.agent import AgentRunner
+from bytes.agent_services import chart_builder, json_repair
+from bytes.agent_services.chart_payload import compact_chart, template_json
+from bytes.agent_services.agent import chart_executor, get_agent_runner, speculation_counters
+from bytes.agent_services.llm_scheduler import llm_http_client, llm_scheduler
 import uvicorn
 from bytes.authenticator_service import Authenticator
 from bytes.database import crud
-from bytes.retriver.retriver import Retriver
+from bytes.retriver.IngestionQueue import IngestionQueue
+from bytes.retriver.retriver import UPLOAD_DIR, Retriver
 from bytes.database.db import DBManager
 from bytes.schemas import Query, Token, TokenData, UserCreate
 from fastapi import File,UploadFile, APIRouter, Depends, FastAPI, HTTPException
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import tempfile
 from  pathlib import Path
 import shutil
@@ -36,7 +45,38 @@ auth_service = Authenticator(
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 router = APIRouter(dependencies=[Depends(auth_service.verify_token)])
 parser = Retriver()
-agent_runner = AgentRunner(model_name=os.getenv("MODEL_TYPE", "none"), api_key=os.getenv("GROQ_API_KEY"))
+ingestion_queue = IngestionQueue(retriver=parser, db_manager=DBManager())
+agent_runner = get_agent_runner()
+@app.on_event("startup")
+def start_ingestion_queue():
+    ingestion_queue.start()
+
+
+@app.on_event("startup")
+def warm_up_agents():
+    agent_runner.warm_up()
+
+
+@app.on_event("startup")
+def start_chart_executor():
+    chart_executor.start()
+
+
+@app.on_event("shutdown")
+def stop_ingestion_queue():
+    ingestion_queue.shutdown()
+
+
+@app.on_event("shutdown")
+def stop_chart_executor():
+    chart_executor.shutdown()
+
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    await llm_http_client.aclose()
+
+
 def get_db_manager():
     """
     Returns a singleton instance of the DBManager class.
@@ -62,6 +102,11 @@ def get_db_session(db_manager: DBManager = Depends(get_db_manager)):
         yield session
 
 
+async def get_async_db_session(db_manager: DBManager = Depends(get_db_manager)):
+    async with db_manager.async_session() as session:
+        yield session
+
+
 @app.post("/token", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
@@ -98,6 +143,15 @@ async def verify_token_route(token: str = Depends(oauth2_scheme)):
         raise e
 
 
+@app.get("/chart-templates/{name}")
+async def get_chart_template(name: str):
+    """Plotly template referenced by compact chart payloads."""
+    template = await run_in_threadpool(template_json, name)
+    if template is None:
+        raise HTTPException(status_code=404, detail="Unknown chart template")
+    return JSONResponse(template, headers={"Cache-Control": "public, max-age=86400"})
+
+
 @app.post("/create-user")
 async def create_user(
     usercreate: UserCreate,
@@ -122,64 +176,165 @@ async def create_user(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+# the sync CRUD managers run on the async connection through run_sync
+async def owns_thread(session: AsyncSession, thread_id: int, username: str) -> bool:
+    return await session.run_sync(
+        lambda db: crud.ThreadManager().get_thread_by_id(thread_id=thread_id, db=db).client_id
+        == crud.ClientManager().get_client_by_username(username=username, db=db).client_id
+    )
+
+
+async def save_exchange(session: AsyncSession, username: str, thread_id: int, query_text: str, response_json: dict):
+    """Store the user query and the bot answer of a thread, returns the bot Chat."""
+    chatmanager = crud.ChatManager()
+    await session.run_sync(
+        lambda db: chatmanager.create_chat_by_username(
+            username=username,
+            thread_id=thread_id,
+            content=query_text,
+            db=db,
+        )
+    )
+    return await session.run_sync(
+        lambda db: chatmanager.create_chat_by_username(
+            username="bot",
+            thread_id=thread_id,
+            content=json.dumps(response_json),
+            db=db,
+        )
+    )
+
+
 @router.post("/query")
 async def query(
     query: Query,
-    session: Session = Depends(get_db_session),
+    session: AsyncSession = Depends(get_async_db_session),
     userToken: TokenData = Depends(auth_service.verify_token),
 ):
+    if not await owns_thread(session, query.thread_id, userToken.username):
+        raise HTTPException(status_code=400, detail="Thread does not belong to user")
     try:
-        if (
-            crud.ThreadManager()
-            .get_thread_by_id(thread_id=query.thread_id, db=session)
-            .client_id
-            != crud.ClientManager()
-            .get_client_by_username(username=userToken.username, db=session)
-            .client_id
-        ):
-            raise HTTPException(
-                status_code=400, detail="Thread does not belong to user"
-            )
-
-        agent_response = agent_runner.run(user_query=query.query, thread_id=0)
-        chatmanager = crud.ChatManager()
-        chatmanager.create_chat_by_username(
-            username=userToken.username,
-            thread_id=query.thread_id,
-            content=query.query,
-            db=session,
-        )
+        retrieval_thread_id = query.thread_id if query.thread_specific_call else 0
+        agent_response = await agent_runner.run(user_query=query.query, thread_id=retrieval_thread_id)
         response_json = {
             "response": agent_response["text"],
-            "chart": agent_response["chart_json"],
+            "chart": compact_chart(agent_response["graph_json"]),
             "table": agent_response["table_json"],
             # "message_id": bot_response.chat_id,
         }
-        bot_response = chatmanager.create_chat_by_username(
-            username="bot",
-            thread_id=query.thread_id,
-            content=json.dumps(response_json),
-            db=session,
+        bot_response = await save_exchange(
+            session, userToken.username, query.thread_id, query.query, response_json
         )
         print(f"Bot response: {bot_response}")
         return response_json
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         print("Exception:", e)
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/query/stream")
+async def query_stream(
+    query: Query,
+    session: AsyncSession = Depends(get_async_db_session),
+    userToken: TokenData = Depends(auth_service.verify_token),
+):
+    """Server-Sent Events version of /query.
+
+    Emits "sources" once retrieval is done, "text" deltas while the summary
+    is generated, "table" and "chart" when available and "done" with the
+    complete persisted message, or "error".
+    """
+    if not await owns_thread(session, query.thread_id, userToken.username):
+        raise HTTPException(status_code=400, detail="Thread does not belong to user")
+    retrieval_thread_id = query.thread_id if query.thread_specific_call else 0
+
+    async def event_stream():
+        start = time.perf_counter()
+        events: asyncio.Queue = asyncio.Queue()
+
+        async def produce() -> dict:
+            try:
+                return await agent_runner.run(
+                    user_query=query.query, thread_id=retrieval_thread_id, events=events
+                )
+            finally:
+                await events.put(None)
+
+        task = asyncio.create_task(produce())
+        # flushes the headers right away
+        yield ": stream open\n\n"
+        try:
+            first = True
+            while (item := await events.get()) is not None:
+                if first:
+                    print(f"/query/stream first event after {time.perf_counter() - start:.2f}s")
+                    first = False
+                event, data = item
+                yield sse_event(event, compact_chart(data) if event == "chart" else data)
+            agent_response = await task
+            response_json = {
+                "response": agent_response["text"],
+                "chart": compact_chart(agent_response["graph_json"]),
+                "table": agent_response["table_json"],
+            }
+            # the request scoped session may be closed once streaming starts
+            async with DBManager().async_session() as stream_session:
+                bot_response = await save_exchange(
+                    stream_session, userToken.username, query.thread_id, query.query, response_json
+                )
+            yield sse_event("done", {**response_json, "message_id": bot_response.message_id})
+            print(f"/query/stream done after {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            print("Exception:", e)
+            yield sse_event("error", {"detail": str(e)})
+        finally:
+            task.cancel()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-def save_file(file, thread_id):
+def save_file(file) -> Path:
     try: 
-        with tempfile.NamedTemporaryFile(delete=False,suffix=".pdf") as temp_file:
+        UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        # stored uploads are kept so page images can be rendered on demand
+        with tempfile.NamedTemporaryFile(dir=UPLOAD_DIR,delete=False,suffix=".pdf") as temp_file:
             shutil.copyfileobj(file.file,temp_file)
             temp_file_path = Path(temp_file.name)
             print(f"File saved to {temp_file_path} temporary file path")
-            # parser.parse(load_path=temp_file_path,thread_id=thread_id)
+            return temp_file_path
     except Exception as e:
         print("Exception:", e)
         raise e
    
     finally:
         file.file.close()
+
+
+def enqueue_ingestion(file, thread_id: int, username: str, db_session: Session) -> int:
+    file_path = save_file(file=file)
+    client = crud.ClientManager().get_client_by_username(username=username, db=db_session)
+    job = crud.JobManager().create_job(
+        thread_id=thread_id,
+        file_path=str(file_path),
+        source_name=file.filename,
+        client_id=client.client_id if client else None,
+        db=db_session,
+    )
+    job_id = job.job_id
+    # the worker claims the job in its own session, so it must be committed first
+    db_session.commit()
+    ingestion_queue.submit(job_id)
+    return job_id
+
+
 @router.post("/upload-pdf")
 async def upload_pdf(
     thread_id: int,
@@ -191,8 +346,8 @@ async def upload_pdf(
             raise HTTPException(status_code=400,detail="Thread does not belong to user")
 
     try:
-        save_file(file=file,thread_id=thread_id)
-        return {"message":"File uploaded successfully"}
+        job_id = enqueue_ingestion(file=file, thread_id=thread_id, username=usertoken.username, db_session=db_session)
+        return {"message":"File uploaded successfully","job_id":job_id}
     except Exception as e:
         print("Exception:", e)
         raise HTTPException(status_code=400,detail=str(e))
@@ -200,14 +355,89 @@ async def upload_pdf(
 async def upload_to_main(
     file: UploadFile = File(...),
     db_session: Session = Depends(get_db_session),
+    usertoken: TokenData = Depends(auth_service.verify_token),
 ):
     try:
-        save_file(file=file,thread_id=0)
-        return {"message":"File uploaded successfully"}
+        job_id = enqueue_ingestion(file=file, thread_id=0, username=usertoken.username, db_session=db_session)
+        return {"message":"File uploaded successfully","job_id":job_id}
     except Exception as e:
         print("Exception:", e)
         raise HTTPException(status_code=400,detail=str(e))
 
+
+def get_owned_job(job_id: int, username: str, db_session: Session):
+    job = crud.JobManager().get_job_by_id(job_id=job_id, db=db_session)
+    client = crud.ClientManager().get_client_by_username(username=username, db=db_session)
+    if job is None or client is None or job.client_id != client.client_id:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return job
+
+
+@router.get("/ingestion-jobs/{job_id}")
+async def get_ingestion_job(
+    job_id: int,
+    db_session: Session = Depends(get_db_session),
+    usertoken: TokenData = Depends(auth_service.verify_token),
+):
+    job = get_owned_job(job_id, usertoken.username, db_session)
+    return {
+        "job_id": job.job_id,
+        "thread_id": job.thread_id,
+        "file_name": job.source_name,
+        "status": job.status,
+        "pages_done": job.pages_done,
+        "pages_total": job.pages_total,
+        "doc_name": job.doc_name,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+
+@router.delete("/ingestion-jobs/{job_id}")
+async def cancel_ingestion_job(
+    job_id: int,
+    db_session: Session = Depends(get_db_session),
+    usertoken: TokenData = Depends(auth_service.verify_token),
+):
+    get_owned_job(job_id, usertoken.username, db_session)
+    if not ingestion_queue.cancel(job_id):
+        raise HTTPException(status_code=400, detail="Ingestion job is already indexing or finished")
+    return {"message": "Ingestion job cancelled"}
+
+
+@router.get("/page-image/{doc_name}/{page_number}")
+async def get_page_image(
+    doc_name: str,
+    page_number: int,
+    thread_id: int,
+    db_session: Session = Depends(get_db_session),
+    usertoken: TokenData = Depends(auth_service.verify_token),
+):
+    if(crud.ThreadManager().get_thread_by_id(thread_id=thread_id,db=db_session).client_id!=crud.ClientManager().get_client_by_username(username=usertoken.username,db=db_session).client_id):
+            raise HTTPException(status_code=400,detail="Thread does not belong to user")
+    if doc_name not in parser.thread_doc_names(thread_id):
+        raise HTTPException(status_code=404, detail="Document not found in thread")
+    try:
+        image_path = await run_in_threadpool(parser.page_images.get, doc_name, page_number)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FileResponse(image_path, media_type="image/jpeg")
+
+@router.get("/cache-stats")
+async def get_cache_stats():
+    stats = parser.cache_stats()
+    if agent_runner.answer_cache is not None:
+        stats["answer_cache"] = agent_runner.answer_cache.stats()
+    stats["speculative_charts"] = dict(speculation_counters)
+    stats["chart_builder"] = dict(chart_builder.counters)
+    stats["chart_executor"] = chart_executor.stats()
+    stats["llm_scheduler"] = llm_scheduler.stats()
+    stats["json_repair"] = dict(json_repair.counters)
+    return stats
+
 @router.get("/threads")
 async def get_threads(
     db_session: Session = Depends(get_db_session),
@@ -279,6 +509,7 @@ async def delete_thread(
             raise HTTPException(status_code=400,detail="Thread does not belong to user")
     try:
         crud.ThreadManager().delete_thread_by_id(thread_id=thread_id,db=db_session)
+        parser.invalidate_thread(thread_id)
         return {"message":"Thread deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=400,detail=str(e))
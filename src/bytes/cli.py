@@ -99,6 +99,380 @@ def run_agent(
             agent.run_agent(query=query, thread_id=thread_id,db=session,thread_specific_call=False)
     except Exception as e:
         console.print("[red]Agent stopped with error:[/red]", e)
+@app.command()
+def run_parser(
+    load_path: Path = typer.Option(..., "--load-path", "-l", help="PDF to parse"),
+    thread_id: int = typer.Option(0, "--thread-id", "-t", help="Thread id"),
+    workers: int = typer.Option(None, "--workers", "-w", help="Ingestion worker processes"),
+    render_images: bool = typer.Option(
+        None, "--render-images/--lazy-images", help="Render page images now or on first request"
+    ),
+):
+    from bytes.retriver.retriver import Retriver
+
+    parser = Retriver()
+    stats = parser.parse(
+        load_path=load_path, thread_id=thread_id, workers=workers, render_images=render_images
+    )
+    if stats["deduplicated"]:
+        console.print(f"[green]Already indexed as {stats['doc_name']}, linked to thread {thread_id}[/green]")
+        return
+    console.print(
+        f"[green]Parsed {stats['pages']} pages ({stats['embedded_pages']} embedded) into {stats['documents']} chunks "
+        f"({stats['pages_per_sec']} pages/sec with {stats['workers']} workers)[/green]"
+    )
+@app.command()
+def export_onnx(
+    output_dir: Path = typer.Option(None, "--output-dir", "-o", help="Export directory"),
+    quantize: bool = typer.Option(True, "--quantize/--no-quantize", help="Also write an int8 model"),
+):
+    from bytes.retriver.OnnxEmbeddings import export_onnx as export
+    from bytes.retriver.retriver import EMBEDDING_MODEL, ONNX_MODEL_DIR
+
+    model_path = export(EMBEDDING_MODEL, output_dir or ONNX_MODEL_DIR, quantize=quantize)
+    console.print(f"[green]Exported {EMBEDDING_MODEL} to {model_path.parent}[/green]")
+
+
+@app.command()
+def bench_embeddings(
+    onnx_dir: Path = typer.Option(None, "--onnx-dir", help="ONNX export directory"),
+    quantized: bool = typer.Option(False, "--quantized", "-q", help="Use the int8 model"),
+    threads: int = typer.Option(None, "--threads", "-t", help="onnxruntime intra-op threads"),
+    n_texts: int = typer.Option(256, "--texts", "-n", help="Number of benchmark texts"),
+):
+    """Compare ONNX vectors and speed against the PyTorch model."""
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from bytes.retriver.OnnxEmbeddings import OnnxEmbeddings, benchmark, parity_check
+    from bytes.retriver.retriver import EMBEDDING_MODEL, ONNX_MODEL_DIR
+
+    samples = [
+        "Revenue from operations grew 12% year on year to 4,512 crore in FY2024.",
+        "EBITDA margin contracted by 80 basis points due to higher input costs.",
+        "Note 14: Trade receivables are stated net of expected credit loss allowance.",
+        "The Board recommended a final dividend of 8 per equity share.",
+        "Net cash from operating activities was 1,204 million compared to 987 million.",
+    ]
+    texts = [f"{samples[i % len(samples)]} (segment {i})" for i in range(n_texts)]
+    reference = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    candidate = OnnxEmbeddings(onnx_dir or ONNX_MODEL_DIR, quantized=quantized, threads=threads)
+
+    console.print("parity:", parity_check(reference, candidate, texts))
+    console.print("torch:", benchmark(reference, texts))
+    console.print("onnx" + (" int8" if quantized else "") + ":", benchmark(candidate, texts))
+
+
+@app.command()
+def bench_agent_setup(
+    iterations: int = typer.Option(100, "--iterations", "-n", help="Simulated requests per variant"),
+):
+    """Per-request setup overhead of rebuilding the agent runtime vs reusing the warm one."""
+    import os
+    import statistics
+    import time
+
+    from pydantic_ai import Agent, Tool
+    from pydantic_ai.models.openai import OpenAIModel
+    from pydantic_ai.providers.openai import OpenAIProvider
+    from pydantic_graph import Graph
+
+    from bytes.agent_services import agent as agent_module
+    from bytes.agent_services.llm_scheduler import LLM_BASE_URL
+
+    model_name = os.getenv("MODEL_TYPE", "none")
+    api_key = os.getenv("GROQ_API_KEY") or "bench"
+
+    def rebuild() -> None:
+        # what every request used to do: own provider (and connection pool), agents, graph and deps
+        model = OpenAIModel(model_name=model_name, provider=OpenAIProvider(base_url=LLM_BASE_URL, api_key=api_key))
+        summarizer = Agent(model=model, output_type=agent_module.summarizerResponse, output_retries=3)
+        grapher = Agent(
+            model=model,
+            output_type=agent_module.graphResponse,
+            tools=[Tool(agent_module.execute_code, takes_ctx=False)],
+            output_retries=3,
+        )
+        agent_module.Deps(summarizer_agent=summarizer, graph_agent=grapher)
+        Graph(nodes=(agent_module.RetriverAgent, agent_module.SummarizerAgent, agent_module.GraphAgent))
+
+    def reuse() -> None:
+        runner = agent_module.get_agent_runner()
+        runner.graph, runner.deps
+
+    def legacy_rebuild() -> None:
+        agent_module.Agent_Service(model="gemini-1.5-flash", db_manager=None).get_main_agent()
+
+    legacy_service = agent_module.Agent_Service(model="gemini-1.5-flash", db_manager=None)
+
+    def measure(func) -> list[float]:
+        func()
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    variants = (
+        ("AgentRunner rebuilt", rebuild),
+        ("AgentRunner reused", reuse),
+        ("Agent_Service rebuilt", legacy_rebuild),
+        ("Agent_Service reused", legacy_service.get_main_agent),
+    )
+    for name, func in variants:
+        timings = sorted(measure(func))
+        console.print(
+            f"[bold]{name:<22}[/bold] mean {statistics.mean(timings):8.3f} ms, "
+            f"p95 {timings[min(int(len(timings) * 0.95), len(timings) - 1)]:8.3f} ms per request"
+        )
+
+
+@app.command()
+def build_index(
+    method: str = typer.Option("hnsw", "--method", "-m", help="hnsw or ivfflat"),
+    m: int = typer.Option(16, "--m", help="HNSW graph degree"),
+    ef_construction: int = typer.Option(64, "--ef-construction", help="HNSW build breadth"),
+    lists: int = typer.Option(100, "--lists", help="IVFFlat list count"),
+):
+    from bytes.retriver.VectorIndexManager import VectorIndexManager
+    from bytes.retriver.retriver import EMBEDDING_DIMENSIONS
+
+    manager = VectorIndexManager(DBManager(), dimensions=EMBEDDING_DIMENSIONS)
+    names = manager.build(method=method, m=m, ef_construction=ef_construction, lists=lists)
+    console.print(f"[green]Indexes ready: {', '.join(names)}[/green]")
+
+
+@app.command()
+def rebuild_index():
+    from bytes.retriver.VectorIndexManager import VectorIndexManager
+    from bytes.retriver.retriver import EMBEDDING_DIMENSIONS
+
+    manager = VectorIndexManager(DBManager(), dimensions=EMBEDDING_DIMENSIONS)
+    names = manager.rebuild()
+    console.print(f"[green]Rebuilt: {', '.join(names) or 'nothing to rebuild'}[/green]")
+
+
+@app.command()
+def drop_index(
+    method: str = typer.Option(None, "--method", "-m", help="hnsw or ivfflat, both if omitted"),
+):
+    from bytes.retriver.VectorIndexManager import VectorIndexManager
+    from bytes.retriver.retriver import EMBEDDING_DIMENSIONS
+
+    VectorIndexManager(DBManager(), dimensions=EMBEDDING_DIMENSIONS).drop(method=method)
+    console.print("[green]ANN index dropped[/green]")
+
+
+@app.command()
+def index_status():
+    from bytes.retriver.VectorIndexManager import VectorIndexManager
+    from bytes.retriver.retriver import EMBEDDING_DIMENSIONS
+
+    for index in VectorIndexManager(DBManager(), dimensions=EMBEDDING_DIMENSIONS).status():
+        console.print(f"[bold]{index['name']}[/bold] ({index['size']}): {index['definition']}")
+
+
+@app.command()
+def sync_vector_index(
+    doc_name: list[str] = typer.Option(None, "--doc-name", "-d", help="Document to sync, all if omitted"),
+):
+    """Rebuild the local memory-mapped vector index from Postgres."""
+    from bytes.retriver.retriver import Retriver
+
+    synced = Retriver().sync_mmap_index(doc_names=doc_name or None)
+    for name, rows in synced.items():
+        console.print(f"{name}: {rows} vectors")
+    console.print(f"[green]Synced {len(synced)} segments[/green]")
+
+
+@app.command()
+def load_test(
+    username: str = typer.Option(..., "--username", "-u", help="User to log in as"),
+    password: str = typer.Option(..., "--password", "-p", help="Password of the user"),
+    thread_id: int = typer.Option(..., "--thread-id", "-t", help="Thread owned by the user"),
+    query: str = typer.Option("Summarize the revenue and profit trend", "--query", "-q", help="Query to send"),
+    url: str = typer.Option("http://127.0.0.1:8021", "--url", help="Backend base url"),
+    concurrency: list[int] = typer.Option([1, 4, 16], "--concurrency", "-c", help="In-flight requests, repeatable"),
+    requests_per_level: int = typer.Option(32, "--requests", "-n", help="Requests per concurrency level"),
+):
+    """Measure /query throughput and latency at increasing numbers of in-flight requests."""
+    import asyncio
+    import statistics
+    import time
+
+    import httpx
+
+    async def run_level(client: httpx.AsyncClient, headers: dict, level: int) -> dict:
+        semaphore = asyncio.Semaphore(level)
+        latencies = []
+        errors = 0
+
+        async def one(i: int) -> None:
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                # distinct queries so the retrieval and answer caches do not hide the work
+                response = await client.post(
+                    "/query",
+                    json={"query": f"{query} ({i})", "thread_id": thread_id},
+                    headers=headers,
+                )
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests_per_level)))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        return {
+            "concurrency": level,
+            "throughput": requests_per_level / elapsed,
+            "p50": statistics.median(latencies),
+            "p95": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+            "errors": errors,
+        }
+
+    async def main() -> None:
+        async with httpx.AsyncClient(base_url=url, timeout=300) as client:
+            token = await client.post("/token", data={"username": username, "password": password})
+            token.raise_for_status()
+            headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+            baseline = None
+            for level in concurrency:
+                result = await run_level(client, headers, level)
+                baseline = baseline or result["throughput"]
+                console.print(
+                    f"[bold]{level:>3} in flight[/bold]: {result['throughput']:.2f} req/s "
+                    f"({result['throughput'] / baseline:.1f}x), p50 {result['p50']:.2f}s, "
+                    f"p95 {result['p95']:.2f}s, {result['errors']} errors"
+                )
+
+    asyncio.run(main())
+
+
+@app.command()
+def llm_standin(
+    port: int = typer.Option(8031, "--port", help="Port to listen on"),
+    requests_per_minute: int = typer.Option(30, "--rpm", help="Requests per minute before answering 429"),
+    failure_rate: float = typer.Option(0.05, "--failure-rate", help="Fraction of requests answered with 503"),
+    latency: float = typer.Option(0.5, "--latency", help="Seconds per completion"),
+):
+    """Run a local OpenAI compatible stand-in with provider like rate limits."""
+    import uvicorn
+
+    from bytes.agent_services.llm_standin import create_app
+
+    console.print(f"[green]Set LLM_BASE_URL=http://127.0.0.1:{port} to use the stand-in[/green]")
+    uvicorn.run(create_app(requests_per_minute, failure_rate, latency), host="127.0.0.1", port=port)
+
+
+@app.command()
+def bench_llm(
+    requests: int = typer.Option(60, "--requests", "-n", help="Chat completions to send"),
+    model: str = typer.Option("stand-in", "--model", "-m", help="Model name"),
+    interactive: int = typer.Option(5, "--interactive", help="How many of them run at interactive priority"),
+):
+    """Send concurrent completions through the shared LLM scheduler and report how they fared."""
+    import asyncio
+    import os
+    import time
+
+    from openai import AsyncOpenAI
+
+    from bytes.agent_services.llm_scheduler import (
+        LLM_BASE_URL,
+        PRIORITY_INTERACTIVE,
+        PRIORITY_SPECULATIVE,
+        llm_http_client,
+        llm_scheduler,
+        use_priority,
+    )
+
+    client = AsyncOpenAI(
+        base_url=LLM_BASE_URL,
+        api_key=os.getenv("GROQ_API_KEY") or "stand-in",
+        http_client=llm_http_client,
+        max_retries=0,
+    )
+    latencies = {PRIORITY_INTERACTIVE: [], PRIORITY_SPECULATIVE: []}
+    failures = 0
+
+    async def one(i: int) -> None:
+        nonlocal failures
+        priority = PRIORITY_INTERACTIVE if i % max(requests // max(interactive, 1), 1) == 0 else PRIORITY_SPECULATIVE
+        start = time.perf_counter()
+        try:
+            with use_priority(priority):
+                await client.chat.completions.create(
+                    model=model, messages=[{"role": "user", "content": f"ping {i}"}], max_tokens=16
+                )
+            latencies[priority].append(time.perf_counter() - start)
+        except Exception as e:
+            failures += 1
+            console.print(f"[red]request {i} failed: {e}[/red]")
+
+    async def main() -> float:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return time.perf_counter() - start
+
+    console.print(f"Sending {requests} completions to {LLM_BASE_URL}")
+    elapsed = asyncio.run(main())
+    succeeded = sum(len(values) for values in latencies.values())
+    console.print(f"[bold]{succeeded}/{requests} succeeded[/bold], {failures} failed in {elapsed:.1f}s")
+    for priority, name in ((PRIORITY_INTERACTIVE, "interactive"), (PRIORITY_SPECULATIVE, "speculative")):
+        if latencies[priority]:
+            console.print(f"{name}: avg {sum(latencies[priority]) / len(latencies[priority]):.2f}s over {len(latencies[priority])}")
+    console.print(llm_scheduler.stats())
+
+
+@app.command()
+def compact_charts(
+    dry_run: bool = typer.Option(False, "--dry-run", help="Only measure, do not rewrite messages"),
+):
+    """Rewrite stored bot messages with compact chart payloads and report the savings."""
+    import json
+
+    from sqlalchemy import text
+
+    from bytes.agent_services.chart_payload import compact_chart, payload_size
+    from bytes.database.models import Chat
+
+    def column_bytes(session) -> int:
+        return session.execute(text('SELECT COALESCE(SUM(pg_column_size(content)), 0) FROM "Chat"')).scalar()
+
+    charts = before = after = 0
+    with db_manager.session() as session:
+        stored_before = column_bytes(session)
+        for chat in session.query(Chat).yield_per(500):
+            try:
+                content = json.loads(chat.content)
+            except ValueError:
+                continue
+            if not isinstance(content, dict) or not isinstance(content.get("chart"), str):
+                continue
+            compacted = compact_chart(content["chart"])
+            if compacted is content["chart"]:
+                continue
+            charts += 1
+            before += payload_size(content["chart"])
+            after += payload_size(compacted)
+            if not dry_run:
+                content["chart"] = compacted
+                chat.content = json.dumps(content)
+        session.flush()
+        stored_after = column_bytes(session)
+
+    console.print(f"{charts} charts: {before:,} -> {after:,} bytes of JSON")
+    if before:
+        console.print(f"payload reduced by {100 * (1 - after / before):.1f}%")
+    if not dry_run:
+        console.print(
+            f"Chat.content on disk (after TOAST compression): {stored_before:,} -> {stored_after:,} bytes, "
+            "run VACUUM to reclaim the space"
+        )
+
+
 @app.command()
 def delete_vecst():
     from bytes.retriver.retriver import Retriver
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+
+from bytes.database.models import IngestionJob
+from sqlalchemy.orm import Session
+
+QUEUED = "queued"
+RUNNING = "running"
+# pages extracted, chunks being written and linked; past the point of cancelling
+INDEXING = "indexing"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+CANCELLABLE_STATUSES = (QUEUED, RUNNING)
+
+
+class JobManager:
+    def create_job(
+        self,
+        thread_id: int,
+        file_path: str,
+        db: Session,
+        source_name: str | None = None,
+        client_id: int | None = None,
+    ) -> IngestionJob:
+        new_job = IngestionJob(
+            thread_id=thread_id,
+            file_path=file_path,
+            source_name=source_name,
+            client_id=client_id,
+            status=QUEUED,
+        )
+        db.add(new_job)
+        db.flush()
+        db.refresh(new_job)
+        return new_job
+
+    def get_job_by_id(self, job_id: int, db: Session) -> IngestionJob | None:
+        return db.query(IngestionJob).filter(IngestionJob.job_id == job_id).first()
+
+    def claim_job(self, job_id: int, db: Session) -> bool:
+        """Atomically move a queued job to running, False if someone else got it."""
+        claimed = (
+            db.query(IngestionJob)
+            .filter(IngestionJob.job_id == job_id, IngestionJob.status == QUEUED)
+            .update(
+                {"status": RUNNING, "updated_at": datetime.utcnow()},
+                synchronize_session=False,
+            )
+        )
+        db.flush()
+        return claimed == 1
+
+    def start_indexing(self, job_id: int, db: Session) -> bool:
+        """Atomically move a running job to indexing, False if it was cancelled meanwhile."""
+        started = (
+            db.query(IngestionJob)
+            .filter(IngestionJob.job_id == job_id, IngestionJob.status == RUNNING)
+            .update(
+                {"status": INDEXING, "updated_at": datetime.utcnow()},
+                synchronize_session=False,
+            )
+        )
+        db.flush()
+        return started == 1
+
+    def update_progress(
+        self, job_id: int, pages_done: int, pages_total: int, db: Session
+    ) -> str | None:
+        """Store page progress and return the current status of the job."""
+        db.query(IngestionJob).filter(IngestionJob.job_id == job_id).update(
+            {
+                "pages_done": pages_done,
+                "pages_total": pages_total,
+                "updated_at": datetime.utcnow(),
+            },
+            synchronize_session=False,
+        )
+        db.flush()
+        job = self.get_job_by_id(job_id, db)
+        return job.status if job else None
+
+    def set_status(
+        self,
+        job_id: int,
+        status: str,
+        db: Session,
+        error: str | None = None,
+        doc_name: str | None = None,
+        only_if: tuple[str, ...] | None = None,
+    ) -> bool:
+        """Set the status, when only_if is given only if the job still has one of those statuses."""
+        values = {"status": status, "updated_at": datetime.utcnow()}
+        if error is not None:
+            values["error"] = error
+        if doc_name is not None:
+            values["doc_name"] = doc_name
+        query = db.query(IngestionJob).filter(IngestionJob.job_id == job_id)
+        if only_if is not None:
+            query = query.filter(IngestionJob.status.in_(only_if))
+        updated = query.update(values, synchronize_session=False)
+        db.flush()
+        return updated == 1
+
+    def touch_jobs(self, job_ids: list[int], db: Session) -> None:
+        """Heartbeat of running jobs, so they are not taken for abandoned ones."""
+        db.query(IngestionJob).filter(
+            IngestionJob.job_id.in_(job_ids), IngestionJob.status.in_((RUNNING, INDEXING))
+        ).update({"updated_at": datetime.utcnow()}, synchronize_session=False)
+        db.flush()
+
+    def cancel_job(self, job_id: int, db: Session) -> bool:
+        """Mark a queued or running job cancelled, False once it is indexing or finished."""
+        cancelled = (
+            db.query(IngestionJob)
+            .filter(
+                IngestionJob.job_id == job_id,
+                IngestionJob.status.in_(CANCELLABLE_STATUSES),
+            )
+            .update(
+                {"status": CANCELLED, "updated_at": datetime.utcnow()},
+                synchronize_session=False,
+            )
+        )
+        db.flush()
+        return cancelled == 1
+
+    def requeue_stale_jobs(self, stale_after: timedelta, db: Session) -> list[int]:
+        """Requeue jobs left running or indexing by a dead worker and return all queued job ids."""
+        cutoff = datetime.utcnow() - stale_after
+        db.query(IngestionJob).filter(
+            IngestionJob.status.in_((RUNNING, INDEXING)), IngestionJob.updated_at < cutoff
+        ).update({"status": QUEUED}, synchronize_session=False)
+        db.flush()
+        jobs = (
+            db.query(IngestionJob)
+            .filter(IngestionJob.status == QUEUED)
+            .order_by(IngestionJob.created_at.asc())
+            .all()
+        )
+        return [job.job_id for job in jobs]
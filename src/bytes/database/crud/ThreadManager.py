@@ -1,5 +1,5 @@
 from bytes.database.crud.ClientManager import ClientManager
-from bytes.database.models import Thread
+from bytes.database.models import Thread, ThreadDocument
 from sqlalchemy.orm import Session
 
 
@@ -40,12 +40,15 @@ class ThreadManager:
         client = self.client_service.get_client_by_username(username, db)
         if not client:
             raise ValueError(f"User '{username}' not found")
-        db.query(Thread).filter(
+        deleted = db.query(Thread).filter(
             Thread.thread_id == thread_id, Thread.client_id == client.client_id
         ).delete()
+        if deleted:
+            db.query(ThreadDocument).filter(ThreadDocument.thread_id == thread_id).delete()
         db.flush()
     def delete_thread_by_id(self, thread_id: int, db: Session) -> None:
         db.query(Thread).filter(Thread.thread_id == thread_id).delete()
+        db.query(ThreadDocument).filter(ThreadDocument.thread_id == thread_id).delete()
         db.flush()
         
     def get_thread_by_id(self, thread_id: int, db: Session) -> Thread:
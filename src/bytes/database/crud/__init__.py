@@ -1,3 +1,4 @@
 from .ChatManager import ChatManager
 from .ClientManager import ClientManager
+from .JobManager import JobManager
 from .ThreadManager import ThreadManager
\ No newline at end of file
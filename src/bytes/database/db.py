@@ -1,12 +1,13 @@
 import os
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 from logging import getLogger
 from threading import Lock
-from typing import Generator
+from typing import AsyncGenerator, Generator
 from urllib.parse import quote_plus
 
 from bytes.database.models import Base
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
 
 logger = getLogger(__name__)
@@ -27,6 +28,8 @@ class DBManager:
     def _init_instance(self):
         self.engine = None
         self._SessionLocal = None
+        self.async_engine = None
+        self._AsyncSessionLocal = None
         user = os.getenv("DB_USER")
         pwd = quote_plus(
             os.getenv("DB_PASSWORD")
@@ -34,6 +37,8 @@ class DBManager:
         name = os.getenv("DB_NAME", "vectordb")  # match your Docker DB name
         host = os.getenv("DB_HOST", "localhost:5435")  # your new port
         self.db_url = f"postgresql+psycopg2://{user}:{pwd}@{host}/{name}"
+        # psycopg 3 driver for the asyncio engine
+        self.async_db_url = f"postgresql+psycopg://{user}:{pwd}@{host}/{name}"
 
     def configure_engine(self):
         """
@@ -47,12 +52,26 @@ class DBManager:
             autocommit=False, autoflush=False, bind=self.engine
         )
 
+    def configure_async_engine(self):
+        """
+        Configure the asyncio database engine used by the request handlers
+        """
+        self.async_engine = create_async_engine(
+            self.async_db_url, echo=False, pool_size=10, max_overflow=20
+        )
+        self._AsyncSessionLocal = async_sessionmaker(
+            bind=self.async_engine, autoflush=False, expire_on_commit=False
+        )
+
     def init_db(self):
         """
         Initialize the database and create tables.
         """
         if self.engine is None:
             self.configure_engine()
+        with self.engine.begin() as conn:
+            # answer_cache has a vector column
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         Base.metadata.create_all(self.engine)
 
     def drop_all(self):
@@ -80,6 +99,24 @@ class DBManager:
             db.commit()
             db.close()
 
+    @asynccontextmanager
+    async def async_session(self) -> AsyncGenerator[AsyncSession, None]:
+        """
+        Async version of session(), commits on success and rolls back on error.
+        """
+        if self.async_engine is None:
+            self.configure_async_engine()
+        db = self._AsyncSessionLocal()
+        try:
+            yield db
+            await db.commit()
+        except Exception as e:
+            logger.error(f"Error in transaction: {e}")
+            await db.rollback()
+            raise e
+        finally:
+            await db.close()
+
 
 if __name__ == "__main__":
     db_manager = DBManager()
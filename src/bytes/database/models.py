@@ -4,22 +4,88 @@ from datetime import datetime
 from sqlalchemy import (
     TIMESTAMP,
     Column,
+    Computed,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
+    JSON,
+    LargeBinary,
     String,
     Text,
 )
-from sqlalchemy.orm import relationship
+from pgvector.sqlalchemy import Vector
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 
 Base = declarative_base()
+# size of the all-MiniLM-L6-v2 embeddings stored in vector columns
+EMBEDDING_DIMENSIONS = 384
 
 
 class DocStore(Base):
     __tablename__ = "docstore"
     doc_id = Column(String, primary_key=True)
     content = Column(Text, nullable=False)
+    content_tsv = deferred(
+        Column(TSVECTOR, Computed("to_tsvector('english', content)", persisted=True))
+    )
+    __table_args__ = (
+        Index("ix_docstore_content_tsv", "content_tsv", postgresql_using="gin"),
+    )
+class EmbeddingCache(Base):
+    __tablename__ = "embedding_cache"
+    # sha256 of model name + normalized chunk text
+    content_hash = Column(String(64), primary_key=True)
+    model_name = Column(String, nullable=False)
+    embedding = Column(LargeBinary, nullable=False)  # float32 bytes
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class AnswerCache(Base):
+    __tablename__ = "answer_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    thread_id = Column(Integer, nullable=False, index=True)
+    question = Column(Text, nullable=False)
+    embedding = Column(Vector(EMBEDDING_DIMENSIONS), nullable=False)  # question embedding
+    text = Column(Text, nullable=False)
+    table_json = Column(JSON, nullable=True)
+    graph_json = Column(Text, nullable=True)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class IndexedDocument(Base):
+    __tablename__ = "indexed_document"
+    doc_name = Column(String, primary_key=True)
+    file_hash = Column(String(64), unique=True, index=True, nullable=False)
+    source_name = Column(String, nullable=True)  # original upload filename
+    page_count = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    pages = relationship("IndexedPage", cascade="all, delete")
+
+
+class IndexedPage(Base):
+    __tablename__ = "indexed_page"
+    doc_name = Column(
+        String, ForeignKey("indexed_document.doc_name", ondelete="CASCADE"), primary_key=True
+    )
+    page_number = Column(Integer, primary_key=True)
+    text_hash = Column(String(64), nullable=False)
+
+
+class ThreadDocument(Base):
+    __tablename__ = "thread_document"
+    # thread 0 is the shared main corpus, so this is not a foreign key to Thread
+    thread_id = Column(Integer, primary_key=True, index=True)
+    doc_name = Column(
+        String, ForeignKey("indexed_document.doc_name", ondelete="CASCADE"), primary_key=True
+    )
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class Clients(Base):
     __tablename__ = "Clients"
     client_id = Column(Integer, primary_key=True, index=True)
@@ -46,6 +112,27 @@ class Thread(Base):
 
 
 
+class IngestionJob(Base):
+    __tablename__ = "ingestion_job"
+    job_id = Column(Integer, primary_key=True, index=True)
+    # thread 0 is the shared main corpus, so this is not a foreign key to Thread
+    thread_id = Column(Integer, nullable=False, index=True)
+    client_id = Column(
+        Integer, ForeignKey("Clients.client_id", ondelete="CASCADE"), nullable=True
+    )
+    file_path = Column(String, nullable=False)
+    source_name = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="queued", index=True)
+    pages_done = Column(Integer, nullable=False, default=0)
+    pages_total = Column(Integer, nullable=False, default=0)
+    doc_name = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    )
+
+
 class Chat(Base):
     __tablename__ = "Chat"
     message_id = Column(Integer, primary_key=True, index=True)
@@ -0,0 +1,135 @@
+import hashlib
+import threading
+from datetime import datetime
+
+import numpy as np
+from bytes.database.db import DBManager
+from bytes.database.models import EmbeddingCache
+from bytes.retriver.LRUCache import LRUCache
+from langchain_core.embeddings import Embeddings
+from sqlalchemy.dialects.postgresql import insert
+
+# keys per SELECT/INSERT statement against embedding_cache
+DB_BATCH_SIZE = 1000
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that caches vectors by content hash.
+
+    Lookups go to an in-process LRU first, then to the embedding_cache
+    table. All remaining misses of a call are embedded with a single model
+    call and written back. Query embeddings are only kept in memory.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        db_manager: DBManager,
+        memory_size: int = 20000,
+    ) -> None:
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.db_manager = db_manager
+        self.memory = LRUCache(maxsize=memory_size)
+        self._counter_lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "model_calls": 0}
+
+    def _key(self, text: str) -> str:
+        payload = f"{self.model_name}\0{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, **increments: int) -> None:
+        with self._counter_lock:
+            for name, value in increments.items():
+                self.counters[name] += value
+
+    def _load(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        with self.db_manager.session() as session:
+            for i in range(0, len(keys), DB_BATCH_SIZE):
+                rows = (
+                    session.query(EmbeddingCache.content_hash, EmbeddingCache.embedding)
+                    .filter(EmbeddingCache.content_hash.in_(keys[i:i + DB_BATCH_SIZE]))
+                    .all()
+                )
+                for content_hash, embedding in rows:
+                    found[content_hash] = np.frombuffer(embedding, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, vectors: dict[str, list[float]]) -> None:
+        rows = [
+            {
+                "content_hash": key,
+                "model_name": self.model_name,
+                "embedding": np.asarray(vector, dtype=np.float32).tobytes(),
+                "created_at": datetime.utcnow(),
+            }
+            for key, vector in vectors.items()
+        ]
+        with self.db_manager.session() as session:
+            for i in range(0, len(rows), DB_BATCH_SIZE):
+                session.execute(
+                    insert(EmbeddingCache)
+                    .values(rows[i:i + DB_BATCH_SIZE])
+                    .on_conflict_do_nothing(index_elements=["content_hash"])
+                )
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors: dict[str, list[float]] = {}
+        for key in set(keys):
+            vector = self.memory.get(key)
+            if vector is not None:
+                vectors[key] = vector
+        memory_hits = sum(1 for key in keys if key in vectors)
+
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+        db_vectors = self._load(missing) if missing else {}
+        vectors.update(db_vectors)
+        db_hits = sum(1 for key in keys if key in db_vectors)
+
+        # first text of every unseen key, embedded in one batch
+        unseen = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in unseen:
+                unseen[key] = text
+        if unseen:
+            computed = self.embeddings.embed_documents(list(unseen.values()))
+            new_vectors = dict(zip(unseen.keys(), computed))
+            vectors.update(new_vectors)
+            self._store(new_vectors)
+            self._count(model_calls=1)
+
+        for key in missing:
+            self.memory.put(key, vectors[key])
+        self._count(
+            memory_hits=memory_hits,
+            db_hits=db_hits,
+            misses=len(keys) - memory_hits - db_hits,
+        )
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        key = "query:" + self._key(text)
+        vector = self.memory.get(key)
+        if vector is not None:
+            self._count(memory_hits=1)
+            return vector
+        vector = self.embeddings.embed_query(text)
+        self.memory.put(key, vector)
+        self._count(misses=1, model_calls=1)
+        return vector
+
+    def stats(self) -> dict:
+        with self._counter_lock:
+            counters = dict(self.counters)
+        lookups = counters["memory_hits"] + counters["db_hits"] + counters["misses"]
+        hits = counters["memory_hits"] + counters["db_hits"]
+        counters["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        counters["memory_entries"] = len(self.memory)
+        return counters
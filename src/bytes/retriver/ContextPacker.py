@@ -0,0 +1,152 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+from bytes.retriver.retriver import DOC_ID_PATTERN
+from langchain.schema.document import Document
+
+# longest chunk overlap looked for when merging neighbours, chunk_overlap is 50 chars
+MAX_OVERLAP_CHARS = 200
+SHINGLE_SIZE = 3
+
+
+@dataclass
+class PackedBlock:
+    doc_ids: list[str]
+    page_number: Optional[int]
+    content: str
+    rank: int
+    tokens: int = 0
+    shingles: set = field(default_factory=set, repr=False)
+
+
+def merge_overlapping(first: str, second: str) -> str:
+    """Join two consecutive chunks, dropping the text the splitter repeated."""
+    for n in range(min(len(first), len(second), MAX_OVERLAP_CHARS), 0, -1):
+        if first.endswith(second[:n]):
+            return first + second[n:]
+    return f"{first}\n{second}"
+
+
+def shingles(text: str) -> set:
+    words = text.lower().split()
+    if len(words) <= SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+class ContextPacker:
+    """Turns ranked chunks into a prompt context bounded by a token budget.
+
+    Consecutive chunks of the same page are merged without their repeated
+    overlap, blocks whose word shingles mostly repeat an already selected
+    block are dropped, and the rest is added in retrieval order until the
+    budget is used up.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 3000,
+        encoding_name: str = "cl100k_base",
+        duplicate_threshold: float = 0.8,
+    ) -> None:
+        self.token_budget = token_budget
+        self.encoding_name = encoding_name
+        self.duplicate_threshold = duplicate_threshold
+        self._encoding = None
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            import tiktoken
+
+            self._encoding = tiktoken.get_encoding(self.encoding_name)
+        return self._encoding
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, tokens: int) -> str:
+        return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:tokens])
+
+    def merge_adjacent(self, documents: list[Document]) -> list[PackedBlock]:
+        """Blocks in retrieval order, runs of consecutive chunks of a page merged into one."""
+        blocks = []
+        pages: dict[tuple[str, int], list[tuple[int, int, Document]]] = {}
+        for rank, doc in enumerate(documents):
+            doc_id = doc.metadata.get("doc_id", "unknown_id")
+            match = DOC_ID_PATTERN.match(doc_id)
+            if match is None or match["kind"] != "chunk":
+                blocks.append(
+                    PackedBlock([doc_id], doc.metadata.get("page_number"), doc.page_content, rank)
+                )
+                continue
+            key = (match["doc_name"], int(match["page"]))
+            pages.setdefault(key, []).append((int(match["index"]), rank, doc))
+
+        for (_, page), chunks in pages.items():
+            chunks.sort(key=lambda chunk: chunk[0])
+            run = None
+            previous_index = None
+            for index, rank, doc in chunks:
+                doc_id = doc.metadata["doc_id"]
+                if index == previous_index:
+                    continue
+                if run is not None and index == previous_index + 1:
+                    run.doc_ids.append(doc_id)
+                    run.content = merge_overlapping(run.content, doc.page_content)
+                    run.rank = min(run.rank, rank)
+                else:
+                    run = PackedBlock([doc_id], page, doc.page_content, rank)
+                    blocks.append(run)
+                previous_index = index
+        return sorted(blocks, key=lambda block: block.rank)
+
+    def is_duplicate(self, block: PackedBlock, selected: list[PackedBlock]) -> bool:
+        for other in selected:
+            overlap = len(block.shingles & other.shingles)
+            smaller = min(len(block.shingles), len(other.shingles)) or 1
+            if overlap / smaller >= self.duplicate_threshold:
+                return True
+        return False
+
+    def pack(self, documents: list[Document], token_budget: Optional[int] = None) -> tuple[list[PackedBlock], dict]:
+        """Select blocks for the prompt.
+
+        Returns:
+            tuple[list[PackedBlock], dict]: blocks in retrieval order and packing stats
+        """
+        budget = token_budget or self.token_budget
+        raw_tokens = sum(self.count_tokens(doc.page_content) for doc in documents)
+        blocks = self.merge_adjacent(documents)
+
+        selected = []
+        used = 0
+        duplicates = 0
+        over_budget = 0
+        for block in blocks:
+            block.shingles = shingles(block.content)
+            if self.is_duplicate(block, selected):
+                duplicates += 1
+                continue
+            block.tokens = self.count_tokens(block.content)
+            if used + block.tokens > budget:
+                if selected:
+                    over_budget += 1
+                    continue
+                # the best block alone does not fit, keep its head
+                block.content = self.truncate(block.content, budget)
+                block.tokens = budget
+            selected.append(block)
+            used += block.tokens
+
+        stats = {
+            "chunks": len(documents),
+            "blocks": len(selected),
+            "merged": len(documents) - len(blocks),
+            "duplicates": duplicates,
+            "over_budget": over_budget,
+            "raw_tokens": raw_tokens,
+            "packed_tokens": used,
+            "saved_tokens": raw_tokens - used,
+        }
+        return selected, stats
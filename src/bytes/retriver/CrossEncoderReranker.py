@@ -0,0 +1,108 @@
+import hashlib
+import threading
+import time
+
+from bytes.retriver.LRUCache import LRUCache
+from langchain.schema.document import Document
+
+
+class CrossEncoderReranker:
+    """Reorders retrieved chunks with a CPU cross-encoder under a time budget.
+
+    At most max_candidates chunks are scored, batch by batch. Scores are
+    cached per (query, doc_id). If the next batch would not finish within
+    budget_seconds the candidates are returned in their retrieval order,
+    so a slow model never delays an answer by more than about one batch.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        max_candidates: int = 50,
+        budget_seconds: float = 0.3,
+        batch_size: int = 16,
+        cache_size: int = 50000,
+    ) -> None:
+        self.model_name = model_name
+        self.max_candidates = max_candidates
+        self.budget_seconds = budget_seconds
+        self.batch_size = batch_size
+        self.scores = LRUCache(maxsize=cache_size)
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self.counters = {"queries": 0, "fallbacks": 0, "scored": 0, "cached_scores": 0, "seconds": 0.0}
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def warm_up(self) -> None:
+        """Load the model and run one prediction, so the first query's budget is not spent on it."""
+        self.model.predict([("warm up", "warm up")], show_progress_bar=False)
+
+    def _key(self, query: str, doc: Document) -> str:
+        doc_id = doc.metadata.get("doc_id") or hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{' '.join(query.lower().split())}\0{doc_id}".encode("utf-8")).hexdigest()
+
+    def _count(self, **increments) -> None:
+        with self._counter_lock:
+            for name, value in increments.items():
+                self.counters[name] += value
+
+    def rerank(self, query: str, documents: list[Document], k: int) -> list[Document]:
+        """Top k of documents by cross-encoder score, or by input order if the budget ran out."""
+        start = time.perf_counter()
+        candidates = documents[: self.max_candidates]
+        keys = [self._key(query, doc) for doc in candidates]
+        scores = {key: self.scores.get(key) for key in keys}
+        pending = [i for i, key in enumerate(keys) if scores[key] is None]
+        cached = len(candidates) - len(pending)
+
+        batch_seconds = 0.0
+        scored = 0
+        for i in range(0, len(pending), self.batch_size):
+            elapsed = time.perf_counter() - start
+            if elapsed + batch_seconds > self.budget_seconds:
+                break
+            batch = pending[i:i + self.batch_size]
+            batch_start = time.perf_counter()
+            predictions = self.model.predict(
+                [(query, candidates[j].page_content) for j in batch],
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+            )
+            batch_seconds = time.perf_counter() - batch_start
+            for j, score in zip(batch, predictions):
+                scores[keys[j]] = float(score)
+                self.scores.put(keys[j], float(score))
+            scored += len(batch)
+
+        elapsed = time.perf_counter() - start
+        if scored + cached < len(candidates):
+            print(
+                f"Rerank budget of {self.budget_seconds}s exceeded after scoring "
+                f"{scored + cached}/{len(candidates)} chunks, keeping retrieval order"
+            )
+            self._count(queries=1, fallbacks=1, scored=scored, cached_scores=cached, seconds=elapsed)
+            return documents[:k]
+
+        order = sorted(range(len(candidates)), key=lambda i: scores[keys[i]], reverse=True)
+        self._count(queries=1, scored=scored, cached_scores=cached, seconds=elapsed)
+        return [candidates[i] for i in order[:k]]
+
+    def stats(self) -> dict:
+        with self._counter_lock:
+            counters = dict(self.counters)
+        queries = counters.pop("queries")
+        seconds = counters.pop("seconds")
+        counters["queries"] = queries
+        counters["avg_ms"] = round(seconds / queries * 1000, 2) if queries else 0.0
+        counters["model"] = self.model_name
+        return counters
@@ -0,0 +1,135 @@
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from bytes.database.db import DBManager
+from bytes.database.models import IndexedDocument, IndexedPage, ThreadDocument
+
+
+def file_digest(load_path: Path) -> str:
+    """sha256 of the file contents."""
+    digest = hashlib.sha256()
+    with open(load_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_digest(text: str) -> str:
+    """sha256 of whitespace normalized text."""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+class DocumentRegistry:
+    """Tracks indexed documents by content hash and which threads use them.
+
+    A document's chunks are embedded once and shared by every thread linked
+    to it through thread_document.
+    """
+
+    def __init__(self, db_manager: DBManager) -> None:
+        self.db_manager = db_manager
+
+    def get_by_hash(self, file_hash: str) -> Optional[str]:
+        """Return the doc_name already indexed for this file hash, if any."""
+        with self.db_manager.session() as session:
+            document = session.query(IndexedDocument).filter_by(file_hash=file_hash).first()
+            return document.doc_name if document else None
+
+    def find_revision(
+        self,
+        thread_id: int,
+        source_name: Optional[str],
+        page_hashes: list[str],
+        min_shared: float = 0.5,
+    ) -> Optional[str]:
+        """Return the newest document of the thread this upload is a revision of.
+
+        A document counts as an earlier revision when it has the same upload
+        name and at least min_shared of the new pages have identical text
+        in it, so an unrelated report that happens to share the file name
+        is not taken for a revision.
+        """
+        if not source_name or not page_hashes:
+            return None
+        with self.db_manager.session() as session:
+            candidates = (
+                session.query(IndexedDocument.doc_name)
+                .join(ThreadDocument, ThreadDocument.doc_name == IndexedDocument.doc_name)
+                .filter(
+                    ThreadDocument.thread_id == thread_id,
+                    IndexedDocument.source_name == source_name,
+                )
+                .order_by(IndexedDocument.created_at.desc())
+                .all()
+            )
+        for candidate in candidates:
+            previous_hashes = set(self.page_hashes(candidate.doc_name).values())
+            shared = sum(1 for text_hash in page_hashes if text_hash in previous_hashes)
+            if shared / len(page_hashes) >= min_shared:
+                return candidate.doc_name
+        return None
+
+    def page_hashes(self, doc_name: str) -> dict[int, str]:
+        with self.db_manager.session() as session:
+            pages = session.query(IndexedPage).filter_by(doc_name=doc_name).all()
+            return {page.page_number: page.text_hash for page in pages}
+
+    def register(
+        self,
+        doc_name: str,
+        file_hash: str,
+        page_hashes: list[str],
+        source_name: Optional[str] = None,
+    ) -> str:
+        """Record an indexed document, returns the doc_name that owns file_hash.
+
+        When a concurrent ingestion of the same file registered it first,
+        nothing is written and that document's doc_name is returned.
+        """
+        try:
+            with self.db_manager.session() as session:
+                session.add(
+                    IndexedDocument(
+                        doc_name=doc_name,
+                        file_hash=file_hash,
+                        source_name=source_name,
+                        page_count=len(page_hashes),
+                    )
+                )
+                session.flush()
+                session.add_all(
+                    IndexedPage(doc_name=doc_name, page_number=i + 1, text_hash=text_hash)
+                    for i, text_hash in enumerate(page_hashes)
+                )
+        except IntegrityError:
+            existing = self.get_by_hash(file_hash)
+            if existing is None:
+                raise
+            return existing
+        return doc_name
+
+    def link(self, thread_id: int, doc_name: str) -> None:
+        with self.db_manager.session() as session:
+            exists = (
+                session.query(ThreadDocument)
+                .filter_by(thread_id=thread_id, doc_name=doc_name)
+                .first()
+            )
+            if not exists:
+                session.add(ThreadDocument(thread_id=thread_id, doc_name=doc_name))
+
+    def unlink(self, thread_id: int, doc_name: Optional[str] = None) -> None:
+        """Remove one document, or every document, from a thread."""
+        with self.db_manager.session() as session:
+            query = session.query(ThreadDocument).filter(ThreadDocument.thread_id == thread_id)
+            if doc_name is not None:
+                query = query.filter(ThreadDocument.doc_name == doc_name)
+            query.delete()
+
+    def doc_names_for_thread(self, thread_id: int) -> list[str]:
+        with self.db_manager.session() as session:
+            rows = session.query(ThreadDocument.doc_name).filter_by(thread_id=thread_id).all()
+            return [row.doc_name for row in rows]
@@ -0,0 +1,80 @@
+from typing import Optional
+
+from bytes.database.db import DBManager
+from langchain.schema.document import Document
+from sqlalchemy import text
+
+# constant of reciprocal rank fusion, dampens the weight of the top ranks
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(
+    result_lists: list[list[Document]], k: int, rrf_k: int = RRF_K
+) -> list[Document]:
+    """Fuse ranked result lists by summing 1 / (rrf_k + rank) per doc_id."""
+    scores: dict[str, float] = {}
+    documents: dict[str, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            doc_id = doc.metadata.get("doc_id", doc.page_content)
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(doc_id, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[doc_id] for doc_id in ranked[:k]]
+
+
+class LexicalSearch:
+    """Postgres full-text search over the docstore.
+
+    Uses the GIN indexed docstore.content_tsv column and joins the vector
+    rows (custom_id = doc_id) for metadata and the thread filter. Query
+    terms are OR-ed and ranked with ts_rank_cd, so exact tokens like
+    "FY2023" or "EBITDA" score without every word having to match.
+    """
+
+    def __init__(self, db_manager: DBManager, collection_name: str) -> None:
+        self.db_manager = db_manager
+        self.collection_name = collection_name
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        doc_names: Optional[list[str]] = None,
+        thread_id: int = 0,
+    ) -> list[Document]:
+        """Top k chunks for the query, restricted to doc_names or, when None, to thread_id."""
+        params = {"collection": self.collection_name, "query": query, "k": k}
+        if doc_names is not None:
+            scope = "e.cmetadata->>'doc_name' = ANY(:doc_names)"
+            params["doc_names"] = list(doc_names)
+        else:
+            scope = "e.cmetadata->>'thread_id' = :thread_id"
+            params["thread_id"] = str(thread_id)
+        with self.db_manager.session() as session:
+            rows = session.execute(
+                text(
+                    f"""
+                    WITH q AS (
+                        SELECT to_tsquery(
+                            'english',
+                            replace(plainto_tsquery('english', :query)::text, '&', '|')
+                        ) AS query
+                    )
+                    SELECT d.content, e.cmetadata, ts_rank_cd(d.content_tsv, q.query) AS rank
+                    FROM docstore d
+                    CROSS JOIN q
+                    JOIN langchain_pg_embedding e ON e.custom_id = d.doc_id
+                    JOIN langchain_pg_collection c
+                        ON c.uuid = e.collection_id AND c.name = :collection
+                    WHERE q.query::text <> '' AND d.content_tsv @@ q.query AND {scope}
+                    ORDER BY rank DESC
+                    LIMIT :k
+                    """
+                ),
+                params,
+            ).all()
+        return [
+            Document(page_content=row.content, metadata=dict(row.cmetadata))
+            for row in rows
+        ]
@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from bytes.database.crud.JobManager import CANCELLED, DONE, FAILED, INDEXING, RUNNING, JobManager
+from bytes.database.db import DBManager
+
+INGEST_QUEUE_WORKERS = int(os.getenv("INGEST_QUEUE_WORKERS", "2"))
+# running jobs without a heartbeat for this long were left by a dead process and are requeued
+INGEST_JOB_STALE_SECONDS = int(os.getenv("INGEST_JOB_STALE_SECONDS", "90"))
+# how often running jobs are touched and abandoned ones looked for
+HEARTBEAT_INTERVAL = min(30.0, INGEST_JOB_STALE_SECONDS / 3)
+# minimum interval between progress writes of one job
+PROGRESS_INTERVAL = 1.0
+
+
+class IngestionCancelled(Exception):
+    pass
+
+
+class IngestionQueue:
+    """Runs Retriver.parse for persisted ingestion jobs on a bounded pool.
+
+    Jobs live in the ingestion_job table, so queued work (and work left
+    running by a dead process) is picked up again. A job is claimed
+    atomically before it runs, so several server processes can share the
+    table without parsing a file twice. Running jobs get a heartbeat, and
+    a monitor thread requeues running jobs whose heartbeat stopped, e.g.
+    after a restart.
+    """
+
+    def __init__(self, retriver, db_manager: DBManager, max_workers: int = INGEST_QUEUE_WORKERS) -> None:
+        self.retriver = retriver
+        self.db_manager = db_manager
+        self.max_workers = max_workers
+        self.job_manager = JobManager()
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        # submitted to this process and not finished yet
+        self._pending: set[int] = set()
+        self._running: set[int] = set()
+        self._stop = threading.Event()
+        self._monitor: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start the worker pool and resume jobs persisted before a restart."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="ingest"
+                )
+                self._stop.clear()
+                self._monitor = threading.Thread(
+                    target=self._monitor_jobs, daemon=True, name="ingest-monitor"
+                )
+                self._monitor.start()
+        self.resume_jobs()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+            # cancelled futures never run, their jobs are resumed from the table
+            self._pending.clear()
+        self._stop.set()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, job_id: int) -> None:
+        if self._executor is None:
+            self.start()
+        with self._lock:
+            if job_id in self._pending:
+                return
+            self._pending.add(job_id)
+        self._executor.submit(self._run_job, job_id)
+
+    def resume_jobs(self) -> None:
+        """Submit queued jobs and running ones whose heartbeat stopped."""
+        with self.db_manager.session() as session:
+            job_ids = self.job_manager.requeue_stale_jobs(
+                timedelta(seconds=INGEST_JOB_STALE_SECONDS), db=session
+            )
+        with self._lock:
+            job_ids = [job_id for job_id in job_ids if job_id not in self._pending]
+        for job_id in job_ids:
+            self.submit(job_id)
+        if job_ids:
+            print(f"Resumed {len(job_ids)} ingestion jobs")
+
+    def _monitor_jobs(self) -> None:
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            try:
+                with self._lock:
+                    running = list(self._running)
+                if running:
+                    with self.db_manager.session() as session:
+                        self.job_manager.touch_jobs(running, db=session)
+                self.resume_jobs()
+            except Exception:
+                print(f"Ingestion job monitor failed: {traceback.format_exc()}")
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a queued or running job, the worker stops at its next progress report.
+
+        Returns False once the job is indexing: its chunks are being written
+        and linked to the thread, so it runs to completion.
+        """
+        with self.db_manager.session() as session:
+            return self.job_manager.cancel_job(job_id, db=session)
+
+    def _progress_callback(self, job_id: int):
+        last_write = 0.0
+        indexing = False
+
+        def progress(pages_done: int, pages_total: int) -> None:
+            nonlocal last_write, indexing
+            if indexing:
+                return
+            now = time.monotonic()
+            if now - last_write < PROGRESS_INTERVAL and pages_done < pages_total:
+                return
+            last_write = now
+            with self.db_manager.session() as session:
+                status = self.job_manager.update_progress(
+                    job_id, pages_done, pages_total, db=session
+                )
+            if status == CANCELLED:
+                raise IngestionCancelled(f"Ingestion job {job_id} cancelled")
+            if pages_done >= pages_total:
+                # every page is extracted, parse goes on to write and link the document
+                with self.db_manager.session() as session:
+                    indexing = self.job_manager.start_indexing(job_id, db=session)
+                if not indexing:
+                    raise IngestionCancelled(f"Ingestion job {job_id} cancelled")
+
+        return progress
+
+    def _run_job(self, job_id: int) -> None:
+        try:
+            with self.db_manager.session() as session:
+                if not self.job_manager.claim_job(job_id, db=session):
+                    return
+                job = self.job_manager.get_job_by_id(job_id, db=session)
+                file_path, thread_id, source_name = job.file_path, job.thread_id, job.source_name
+            with self._lock:
+                self._running.add(job_id)
+            self._parse_job(job_id, Path(file_path), thread_id, source_name)
+        finally:
+            with self._lock:
+                self._pending.discard(job_id)
+                self._running.discard(job_id)
+
+    def _parse_job(self, job_id: int, load_path: Path, thread_id: int, source_name: str | None) -> None:
+        try:
+            stats = self.retriver.parse(
+                load_path=load_path,
+                thread_id=thread_id,
+                source_name=source_name,
+                progress=self._progress_callback(job_id),
+            )
+        except IngestionCancelled:
+            print(f"Ingestion job {job_id} cancelled")
+            load_path.unlink(missing_ok=True)
+            return
+        except Exception as e:
+            print(f"Ingestion job {job_id} failed: {traceback.format_exc()}")
+            with self.db_manager.session() as session:
+                self.job_manager.set_status(job_id, FAILED, db=session, error=str(e), only_if=(RUNNING, INDEXING))
+            return
+
+        if stats["doc_name"] != load_path.stem:
+            # the same content was already indexed, the stored copy is redundant
+            load_path.unlink(missing_ok=True)
+        with self.db_manager.session() as session:
+            self.job_manager.set_status(
+                job_id, DONE, db=session, doc_name=stats["doc_name"], only_if=(INDEXING,)
+            )
@@ -0,0 +1,222 @@
+import heapq
+import json
+import os
+import struct
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+MAGIC = b"BYTESIDX"
+ALIGNMENT = 64
+# segments with at least this many rows get an IVF coarse quantizer
+IVF_MIN_ROWS = 4096
+KMEANS_ITERATIONS = 10
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray]:
+    """Compress float32 vectors, int8 uses a per-row scale."""
+    if dtype == "float16":
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def kmeans(vectors: np.ndarray, n_clusters: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means on normalized vectors, returns (centroids, assignments)."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(n_clusters):
+            members = vectors[assignments == cluster]
+            if len(members):
+                centroid = members.mean(axis=0)
+                centroids[cluster] = centroid / max(np.linalg.norm(centroid), 1e-12)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+class Segment:
+    """Read-only memory-mapped view of one segment file."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        stat = os.stat(path)
+        self.version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a vector index segment")
+            (header_len,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_len))
+        self.metadatas: list[dict] = header["metadatas"]
+        self.dtype = header["dtype"]
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            arrays[name] = np.memmap(
+                path, dtype=spec["dtype"], mode="r", offset=spec["offset"], shape=tuple(spec["shape"])
+            )
+        self.codes = arrays["codes"]
+        self.scales = arrays["scales"]
+        self.centroids = arrays.get("centroids")
+        self.offsets = arrays.get("offsets")
+
+    def __len__(self) -> int:
+        return len(self.metadatas)
+
+    def dequantize(self) -> np.ndarray:
+        return self.codes.astype(np.float32) * self.scales[:, None]
+
+    def search(self, query: np.ndarray, k: int, nprobe: int) -> list[tuple[float, int]]:
+        if len(self) == 0:
+            return []
+        if self.centroids is not None:
+            probes = np.argsort(-(self.centroids @ query))[:nprobe]
+            rows = np.concatenate(
+                [np.arange(self.offsets[c], self.offsets[c + 1]) for c in probes]
+            )
+            scores = (self.codes[rows].astype(np.float32) @ query) * self.scales[rows]
+        else:
+            rows = None
+            scores = (self.codes.astype(np.float32) @ query) * self.scales
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [
+            (float(scores[i]), int(rows[i]) if rows is not None else int(i))
+            for i in top
+        ]
+
+
+class MmapVectorIndex:
+    """In-process ANN index over memory-mapped segment files.
+
+    One segment file per document holds int8 (or float16) vectors, their
+    scales and the chunk metadata. Files are replaced atomically, so every
+    uvicorn worker can map the same pages read-only and picks up a new
+    version on its next search. Large segments get an IVF coarse quantizer
+    (rows stored grouped by cluster) and only nprobe clusters are scanned.
+    Vectors are assumed L2 normalized, so the dot product is the cosine.
+    """
+
+    def __init__(self, index_dir: Path, dtype: str = "int8", nprobe: int = 8) -> None:
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"Unsupported vector dtype {dtype}")
+        self.index_dir = Path(index_dir)
+        self.dtype = dtype
+        self.nprobe = nprobe
+        self._segments: dict[str, Segment] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, segment: str) -> Path:
+        if Path(segment).name != segment:
+            raise ValueError(f"Invalid segment name {segment}")
+        return self.index_dir / f"{segment}.idx"
+
+    def has_segment(self, segment: str) -> bool:
+        return self._path(segment).exists()
+
+    def _open(self, segment: str) -> Optional[Segment]:
+        path = self._path(segment)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._segments.pop(segment, None)
+            return None
+        with self._lock:
+            cached = self._segments.get(segment)
+            if cached is not None and cached.version == (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+                return cached
+        opened = Segment(path)
+        with self._lock:
+            self._segments[segment] = opened
+        return opened
+
+    def write_segment(self, segment: str, vectors: np.ndarray, metadatas: list[dict]) -> None:
+        """Replace a segment with the given float32 vectors."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) == 0:
+            self.delete_segment(segment)
+            return
+        order = np.arange(len(vectors))
+        arrays = {}
+        if len(vectors) >= IVF_MIN_ROWS:
+            n_clusters = int(np.sqrt(len(vectors)))
+            centroids, assignments = kmeans(vectors, n_clusters)
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=n_clusters)
+            arrays["centroids"] = centroids.astype(np.float32)
+            arrays["offsets"] = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        codes, scales = quantize(vectors[order], self.dtype)
+        arrays = {"codes": codes, "scales": scales, **arrays}
+        metadatas = [metadatas[i] for i in order]
+
+        specs = {
+            name: {"dtype": str(array.dtype), "shape": list(array.shape), "offset": 0}
+            for name, array in arrays.items()
+        }
+        # header size depends on the offsets, so lay out until it is stable
+        while True:
+            header = json.dumps(
+                {"dtype": self.dtype, "arrays": specs, "metadatas": metadatas}
+            ).encode("utf-8")
+            offset = len(MAGIC) + 4 + len(header)
+            changed = False
+            for name, array in arrays.items():
+                offset += -offset % ALIGNMENT
+                if specs[name]["offset"] != offset:
+                    specs[name]["offset"] = offset
+                    changed = True
+                offset += array.nbytes
+            if not changed:
+                break
+
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.index_dir, suffix=".tmp", delete=False) as tmp:
+            tmp.write(MAGIC)
+            tmp.write(struct.pack("<I", len(header)))
+            tmp.write(header)
+            for name, array in arrays.items():
+                tmp.write(b"\0" * (specs[name]["offset"] - tmp.tell()))
+                tmp.write(np.ascontiguousarray(array).tobytes())
+        os.replace(tmp.name, self._path(segment))
+
+    def append(self, segment: str, vectors: list[list[float]], metadatas: list[dict]) -> None:
+        """Add rows to a segment, replacing rows with the same doc_id."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        existing = self._open(segment)
+        if existing is not None and len(existing):
+            new_ids = {metadata["doc_id"] for metadata in metadatas}
+            keep = [i for i, metadata in enumerate(existing.metadatas) if metadata["doc_id"] not in new_ids]
+            vectors = np.concatenate([existing.dequantize()[keep], vectors])
+            metadatas = [existing.metadatas[i] for i in keep] + list(metadatas)
+        self.write_segment(segment, vectors, metadatas)
+
+    def delete_segment(self, segment: str) -> None:
+        self._path(segment).unlink(missing_ok=True)
+        with self._lock:
+            self._segments.pop(segment, None)
+
+    def search(self, segments: list[str], query: list[float], k: int) -> list[tuple[float, dict]]:
+        """Top k (score, metadata) over the given segments."""
+        query = np.asarray(query, dtype=np.float32)
+        query /= max(np.linalg.norm(query), 1e-12)
+        candidates = []
+        for name in segments:
+            segment = self._open(name)
+            if segment is None:
+                continue
+            for score, row in segment.search(query, k, self.nprobe):
+                candidates.append((score, segment.metadatas[row]))
+        return heapq.nlargest(k, candidates, key=lambda candidate: candidate[0])
+
+    def segment_sizes(self) -> dict[str, int]:
+        return {
+            path.stem: len(Segment(path))
+            for path in sorted(self.index_dir.glob("*.idx"))
+        }
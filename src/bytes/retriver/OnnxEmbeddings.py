@@ -0,0 +1,157 @@
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_quantized.onnx"
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence embeddings from an ONNX export of a sentence-transformers model.
+
+    Runs on onnxruntime's CPU provider with mean pooling and L2
+    normalisation, which matches all-MiniLM-L6-v2 under sentence-transformers,
+    so the vectors can share the existing collection.
+    """
+
+    def __init__(
+        self,
+        model_dir: Path,
+        quantized: bool = False,
+        threads: Optional[int] = None,
+        batch_size: int = 32,
+        max_length: int = 256,
+    ) -> None:
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "The onnx embedding backend needs onnxruntime, install it with `pip install onnxruntime`"
+            ) from e
+
+        model_path = Path(model_dir) / (QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+        if not model_path.exists():
+            raise FileNotFoundError(
+                f"{model_path} not found, create it with `bytes export-onnx`"
+            )
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            encoded = self.tokenizer(
+                texts[i:i + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            feeds = {
+                name: value.astype(np.int64)
+                for name, value in encoded.items()
+                if name in self.input_names
+            }
+            token_embeddings = self.session.run(None, feeds)[0]
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.extend(pooled.tolist())
+        return vectors
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([text])[0]
+
+
+def export_onnx(model_name: str, output_dir: Path, quantize: bool = True) -> Path:
+    """Export a sentence-transformers model to ONNX, optionally int8 quantized.
+
+    Needs torch and transformers (installed with sentence-transformers) and
+    onnxruntime for the quantization step.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    hub_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(hub_name)
+    model = AutoModel.from_pretrained(hub_name).eval()
+
+    sample = tokenizer(["revenue grew 12% in FY2024"], return_tensors="pt")
+    input_names = list(sample.keys())
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    model_path = output_dir / MODEL_FILE
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            str(model_path),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+        )
+    tokenizer.save_pretrained(str(output_dir))
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(
+            str(model_path), str(output_dir / QUANTIZED_MODEL_FILE), weight_type=QuantType.QInt8
+        )
+    return model_path
+
+
+def parity_check(reference: Embeddings, candidate: Embeddings, texts: list[str]) -> dict:
+    """Cosine similarity between the vectors of two backends on the same texts."""
+    ref = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    cand = np.asarray(candidate.embed_documents(texts), dtype=np.float32)
+    ref /= np.clip(np.linalg.norm(ref, axis=1, keepdims=True), 1e-12, None)
+    cand /= np.clip(np.linalg.norm(cand, axis=1, keepdims=True), 1e-12, None)
+    cosine = (ref * cand).sum(axis=1)
+    return {
+        "texts": len(texts),
+        "min_cosine": round(float(cosine.min()), 6),
+        "mean_cosine": round(float(cosine.mean()), 6),
+    }
+
+
+def benchmark(embeddings: Embeddings, texts: list[str], repeats: int = 3) -> dict:
+    """Single query latency and batched document throughput of a backend."""
+    embeddings.embed_documents(texts[:8])  # warm up
+
+    query_times = []
+    for text in texts[:50]:
+        start = time.perf_counter()
+        embeddings.embed_query(text)
+        query_times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        embeddings.embed_documents(texts)
+    elapsed = time.perf_counter() - start
+    query_times.sort()
+    return {
+        "query_p50_ms": round(query_times[len(query_times) // 2] * 1000, 2),
+        "query_p95_ms": round(query_times[int(len(query_times) * 0.95) - 1] * 1000, 2),
+        "docs_per_sec": round(len(texts) * repeats / elapsed, 1),
+    }
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import fitz  # PyMuPDF
+
+
+class PageImageCache:
+    """Size bounded on-disk cache of rendered page images.
+
+    Pages are rendered to JPEG on first request from the stored upload and
+    evicted least-recently-used once the cache grows past max_bytes.
+    """
+
+    def __init__(
+        self, cache_dir: Path, source_dir: Path, max_bytes: int, zoom: float = 1.0
+    ) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.source_dir = Path(source_dir)
+        self.max_bytes = max_bytes
+        self.zoom = zoom
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Path, int] = OrderedDict()
+        self._total_bytes = 0
+        self._load_existing()
+
+    def _load_existing(self) -> None:
+        if not self.cache_dir.exists():
+            return
+        files = sorted(self.cache_dir.glob("*/*.jpg"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self._entries[path] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict()
+
+    def source_path(self, doc_name: str) -> Path:
+        if Path(doc_name).name != doc_name:
+            raise ValueError(f"Invalid document name {doc_name}")
+        return self.source_dir / f"{doc_name}.pdf"
+
+    def _image_path(self, doc_name: str, page_number: int) -> Path:
+        return self.cache_dir / doc_name / f"page_{page_number}.jpg"
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            path, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            path.unlink(missing_ok=True)
+
+    def _render(self, doc, page_number: int, path: Path) -> int:
+        if page_number < 1 or page_number > doc.page_count:
+            raise ValueError(f"Page {page_number} out of range (1-{doc.page_count})")
+        pix = doc[page_number - 1].get_pixmap(matrix=fitz.Matrix(self.zoom, self.zoom))
+        data = pix.tobytes("jpeg")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write then rename so concurrent readers never see a partial file
+        with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False) as tmp:
+            tmp.write(data)
+        os.replace(tmp.name, path)
+        return len(data)
+
+    def get(self, doc_name: str, page_number: int, doc=None) -> Path:
+        """Return the path of a rendered page, rendering it if needed.
+
+        Args:
+            doc_name (str): document name (stem of the stored upload)
+            page_number (int): 1-based page number
+            doc: already opened fitz document, opened from source_dir if None
+
+        Returns:
+            Path: JPEG file of the page
+        """
+        path = self._image_path(doc_name, page_number)
+        with self._lock:
+            if path in self._entries and path.exists():
+                self._entries.move_to_end(path)
+                os.utime(path)
+                return path
+
+        if doc is not None:
+            size = self._render(doc, page_number, path)
+        else:
+            source = self.source_path(doc_name)
+            if not source.exists():
+                raise FileNotFoundError(f"No stored document named {doc_name}")
+            with fitz.open(str(source)) as opened:
+                size = self._render(opened, page_number, path)
+
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(path, 0)
+            self._entries[path] = size
+            self._evict()
+        return path
+
+    def invalidate(self, doc_name: Optional[str] = None) -> None:
+        """Drop cached pages of one document, or everything."""
+        with self._lock:
+            for path in list(self._entries):
+                if doc_name is None or path.parent.name == doc_name:
+                    self._total_bytes -= self._entries.pop(path)
+                    path.unlink(missing_ok=True)
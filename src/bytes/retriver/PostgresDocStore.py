@@ -1,31 +1,55 @@
+import time
 from typing import List, Optional, Tuple
 
 from bytes.database.db import DBManager
 from bytes.database.models import DocStore
 from langchain_core.stores import BaseStore
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+# rows per multi-row INSERT ... ON CONFLICT statement
+UPSERT_BATCH_SIZE = 1000
 
 
 class PostgresDocStore(BaseStore[str, str]):
     def __init__(self, db_manager: DBManager) -> None:
         self.db_manager = db_manager
 
+    def upsert(self, session: Session, pairs: List[Tuple[str, str]]) -> int:
+        """Upsert key-value pairs with batched INSERT ... ON CONFLICT DO UPDATE.
+
+        Runs in the caller's session so it can share a transaction with the
+        vector writes.
+
+        Returns:
+            int: number of rows written
+        """
+        # a statement may not touch the same key twice, the last value wins
+        rows = [{"doc_id": doc_id, "content": content} for doc_id, content in dict(pairs).items()]
+        for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+            stmt = insert(DocStore).values(rows[i:i + UPSERT_BATCH_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[DocStore.doc_id],
+                set_={"content": stmt.excluded.content},
+            )
+            session.execute(stmt)
+        return len(rows)
+
     def mset(self, pairs: List[Tuple[str, str]]) -> None:
         """Set multiple key-values pairs in docstore
 
         Args:
-            pairs (List[Tuple[str,str]]): _description_
+            pairs (List[Tuple[str,str]]): (doc_id, content) pairs
         """
-
+        start = time.perf_counter()
         with self.db_manager.session() as session:
-            for doc_id, content in pairs:
-                existing = session.query(DocStore).filter_by(doc_id=doc_id).first()
-                if existing:
-                    existing.content = content
-                else:
-                    docstore = DocStore(doc_id=doc_id, content=content)
-                    session.add(docstore)
-
-        print(f"✅ Set {len(pairs)} key-value pairs in docstore")
+            written = self.upsert(session, pairs)
+        elapsed = time.perf_counter() - start
+
+        print(
+            f"✅ Set {written} key-value pairs in docstore "
+            f"({written / elapsed if elapsed > 0 else 0:.0f} rows/sec)"
+        )
 
     def mget(self, keys: List[str]) -> List[Optional[str]]:
         """get multiple values by keys:"""
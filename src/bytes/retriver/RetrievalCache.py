@@ -0,0 +1,184 @@
+import hashlib
+import pickle
+import sqlite3
+import string
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from bytes.retriver.LRUCache import LRUCache
+from langchain.schema.document import Document
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return " ".join(query.lower().split()).rstrip(string.punctuation + " ")
+
+
+class MemoryBackend:
+    """Per-process TTL + LRU storage."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.entries = LRUCache(maxsize=maxsize, ttl=ttl, on_evict=self._forget)
+        self._thread_keys: dict[int, set[str]] = {}
+        self._key_threads: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _forget(self, key: str) -> None:
+        """Drop an evicted or expired key from the thread index."""
+        with self._lock:
+            thread_id = self._key_threads.pop(key, None)
+            keys = self._thread_keys.get(thread_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._thread_keys[thread_id]
+
+    def get(self, key: str) -> Optional[tuple[list[Document], float]]:
+        return self.entries.get(key)
+
+    def put(self, key: str, thread_id: int, value: tuple[list[Document], float]) -> None:
+        with self._lock:
+            self._thread_keys.setdefault(thread_id, set()).add(key)
+            self._key_threads[key] = thread_id
+        self.entries.put(key, value)
+
+    def invalidate_thread(self, thread_id: int) -> int:
+        with self._lock:
+            keys = self._thread_keys.pop(thread_id, set())
+            for key in keys:
+                self._key_threads.pop(key, None)
+        return sum(1 for key in keys if self.entries.pop(key) is not None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        with self._lock:
+            self._thread_keys.clear()
+            self._key_threads.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class SqliteBackend:
+    """TTL + LRU storage in a local sqlite file shared by every worker on the host."""
+
+    def __init__(self, path: Path, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS retrieval_cache (
+                    key TEXT PRIMARY KEY,
+                    thread_id INTEGER NOT NULL,
+                    expires REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    value BLOB NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_retrieval_cache_thread ON retrieval_cache (thread_id)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_retrieval_cache_access ON retrieval_cache (last_access)"
+            )
+
+    def get(self, key: str) -> Optional[tuple[list[Document], float]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM retrieval_cache WHERE key = ? AND expires > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE retrieval_cache SET last_access = ? WHERE key = ?", (now, key)
+            )
+        return pickle.loads(row[0])
+
+    def put(self, key: str, thread_id: int, value: tuple[list[Document], float]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO retrieval_cache VALUES (?, ?, ?, ?, ?)",
+                (key, thread_id, now + self.ttl, now, pickle.dumps(value)),
+            )
+            self._conn.execute("DELETE FROM retrieval_cache WHERE expires <= ?", (now,))
+            self._conn.execute(
+                """
+                DELETE FROM retrieval_cache WHERE key IN (
+                    SELECT key FROM retrieval_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.maxsize,),
+            )
+
+    def invalidate_thread(self, thread_id: int) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM retrieval_cache WHERE thread_id = ?", (thread_id,)
+            ).rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM retrieval_cache")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM retrieval_cache").fetchone()[0]
+
+
+class RetrievalCache:
+    """Caches retrieval results by (normalized query, thread_id, k, mode).
+
+    Entries of a thread are dropped as soon as its documents change, see
+    Retriver.invalidate_thread. The sqlite backend shares entries and
+    invalidations between worker processes on the same host.
+    """
+
+    def __init__(self, backend) -> None:
+        self.backend = backend
+        self._counter_lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "invalidated": 0, "saved_seconds": 0.0}
+
+    @staticmethod
+    def key(query: str, thread_id: int, k: int, mode: str) -> str:
+        raw = f"{normalize_query(query)}\0{thread_id}\0{k}\0{mode}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, query: str, thread_id: int, k: int, mode: str) -> Optional[list[Document]]:
+        entry = self.backend.get(self.key(query, thread_id, k, mode))
+        with self._counter_lock:
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            documents, latency = entry
+            self.counters["hits"] += 1
+            self.counters["saved_seconds"] += latency
+        return list(documents)
+
+    def put(
+        self, query: str, thread_id: int, k: int, mode: str, documents: list[Document], latency: float
+    ) -> None:
+        self.backend.put(self.key(query, thread_id, k, mode), thread_id, (list(documents), latency))
+
+    def invalidate_thread(self, thread_id: int) -> None:
+        removed = self.backend.invalidate_thread(thread_id)
+        with self._counter_lock:
+            self.counters["invalidated"] += removed
+
+    def stats(self) -> dict:
+        with self._counter_lock:
+            counters = dict(self.counters)
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round(counters["hits"] / lookups, 4) if lookups else 0.0
+        counters["saved_seconds"] = round(counters["saved_seconds"], 3)
+        counters["entries"] = len(self.backend)
+        return counters
@@ -0,0 +1,112 @@
+import re
+import threading
+from typing import Optional
+
+from bytes.database.db import DBManager
+from bytes.database.models import AnswerCache
+from langchain_core.embeddings import Embeddings
+from sqlalchemy import update
+
+# fiscal periods, quarters/halves and numbers, which embeddings barely tell apart
+QUESTION_KEY = re.compile(
+    r"\b(?:(?:fy|cy)\s*'?\d{2,4}(?:[-/]\d{2,4})?|[qh][1-4]|\d[\d,]*(?:\.\d+)?%?)",
+    re.IGNORECASE,
+)
+# nearest questions checked for matching keys
+LOOKUP_CANDIDATES = 5
+
+
+def question_keys(question: str) -> frozenset:
+    """Numbers and periods of a question, "FY 2023" -> "fy2023", "1,204" -> "1204"."""
+    return frozenset(
+        re.sub(r"[\s',]", "", match).lower() for match in QUESTION_KEY.findall(question)
+    )
+
+
+class SemanticAnswerCache:
+    """Stores final agent answers per thread and serves near-duplicate questions.
+
+    A question is embedded and compared (cosine) against the questions
+    already answered on the same thread. If a close one reaches the
+    threshold and mentions the same numbers and periods (embeddings put
+    "revenue in FY23" right next to "revenue in FY24") its answer is
+    returned and no LLM is called. Rows live in
+    Postgres, so every worker shares them, and a thread's rows are deleted
+    when its documents change (see Retriver.add_thread_listener).
+    """
+
+    def __init__(self, db_manager: DBManager, embeddings: Embeddings, threshold: float = 0.92) -> None:
+        self.db_manager = db_manager
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self._counter_lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "key_mismatches": 0, "stored": 0, "invalidated": 0}
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._counter_lock:
+            self.counters[name] += value
+
+    def lookup(self, question: str, thread_id: int) -> Optional[dict]:
+        """Answer of the most similar previous question on the thread, None below the threshold."""
+        embedding = self.embeddings.embed_query(question)
+        distance = AnswerCache.embedding.cosine_distance(embedding)
+        keys = question_keys(question)
+        with self.db_manager.session() as session:
+            rows = (
+                session.query(AnswerCache, distance.label("distance"))
+                .filter(AnswerCache.thread_id == thread_id, distance <= 1.0 - self.threshold)
+                .order_by(distance)
+                .limit(LOOKUP_CANDIDATES)
+                .all()
+            )
+            row = next((row for row in rows if question_keys(row.AnswerCache.question) == keys), None)
+            if row is None:
+                self._count("misses")
+                if rows:
+                    self._count("key_mismatches")
+                return None
+            entry = row.AnswerCache
+            session.execute(
+                update(AnswerCache).where(AnswerCache.id == entry.id).values(hits=AnswerCache.hits + 1)
+            )
+            answer = {"text": entry.text, "table_json": entry.table_json, "graph_json": entry.graph_json}
+            print(
+                f"Answer cache hit on thread {thread_id}: {question!r} ~ {entry.question!r} "
+                f"(similarity {1.0 - row.distance:.3f})"
+            )
+        self._count("hits")
+        return answer
+
+    def store(self, question: str, thread_id: int, answer: dict) -> None:
+        if not answer.get("text"):
+            return
+        embedding = self.embeddings.embed_query(question)
+        with self.db_manager.session() as session:
+            session.add(
+                AnswerCache(
+                    thread_id=thread_id,
+                    question=question,
+                    embedding=embedding,
+                    text=answer["text"],
+                    table_json=answer.get("table_json"),
+                    graph_json=answer.get("graph_json"),
+                )
+            )
+        self._count("stored")
+
+    def invalidate_thread(self, thread_id: int) -> None:
+        with self.db_manager.session() as session:
+            removed = (
+                session.query(AnswerCache)
+                .filter(AnswerCache.thread_id == thread_id)
+                .delete(synchronize_session=False)
+            )
+        self._count("invalidated", removed)
+
+    def stats(self) -> dict:
+        with self._counter_lock:
+            counters = dict(self.counters)
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round(counters["hits"] / lookups, 4) if lookups else 0.0
+        counters["threshold"] = self.threshold
+        return counters
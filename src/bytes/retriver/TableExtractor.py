@@ -0,0 +1,161 @@
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterable, Optional
+
+import camelot
+import fitz  # PyMuPDF
+import pandas as pd
+
+# a page needs this many horizontal/vertical rulings before lattice is tried
+LATTICE_MIN_RULINGS = 6
+# text rows with at least this many gap separated cells look like table rows
+STREAM_MIN_CELLS = 3
+STREAM_MIN_ROWS = 3
+# horizontal whitespace (pt) that separates two cells of a row
+CELL_GAP = 12.0
+ROW_TOLERANCE = 3.0
+
+
+def format_page_spec(pages: Iterable[int]) -> str:
+    """Compress page numbers into a camelot page spec, e.g. [1,2,3,7] -> "1-3,7"."""
+    pages = sorted(set(pages))
+    if not pages:
+        return ""
+    parts = []
+    start = prev = pages[0]
+    for page in pages[1:]:
+        if page == prev + 1:
+            prev = page
+            continue
+        parts.append(f"{start}-{prev}" if prev > start else str(start))
+        start = prev = page
+    parts.append(f"{start}-{prev}" if prev > start else str(start))
+    return ",".join(parts)
+
+
+def clean_table_df(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.apply(
+        lambda col: col.map(
+            lambda x: x.strip() if isinstance(x, str) else x
+        )
+    )
+    return (
+        df.replace(["", "nan", "NaN", "NULL"], pd.NA)
+        .dropna(how="all")
+        .fillna("")
+    )
+
+
+def count_rulings(page) -> int:
+    """Count horizontal and vertical line segments drawn on the page."""
+    rulings = 0
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] == "re":
+                rulings += 4
+            elif item[0] == "l":
+                p1, p2 = item[1], item[2]
+                if abs(p1.y - p2.y) < 1 or abs(p1.x - p2.x) < 1:
+                    rulings += 1
+    return rulings
+
+
+def count_tabular_rows(page) -> int:
+    """Count text rows that split into several cells with a numeric one."""
+    rows = defaultdict(list)
+    for x0, y0, x1, y1, word, *_ in page.get_text("words"):
+        rows[round(y0 / ROW_TOLERANCE)].append((x0, x1, word))
+
+    tabular_rows = 0
+    for words in rows.values():
+        words.sort()
+        cells = 1
+        has_number = any(ch.isdigit() for ch in words[0][2])
+        for (_, prev_x1, _), (x0, _, word) in zip(words, words[1:]):
+            if x0 - prev_x1 > CELL_GAP:
+                cells += 1
+            has_number = has_number or any(ch.isdigit() for ch in word)
+        if cells >= STREAM_MIN_CELLS and has_number:
+            tabular_rows += 1
+    return tabular_rows
+
+
+class TableExtractor:
+    """Camelot table extraction that only parses pages likely to hold tables.
+
+    Pages are pre-filtered with PyMuPDF (ruling lines -> lattice, column
+    aligned text rows -> stream), then camelot runs once per flavor over the
+    batched page ranges.
+    """
+
+    def detect_table_pages(self, doc, pages: Iterable[int]) -> dict[int, list[str]]:
+        """Return page number -> flavors worth trying, in order, for candidate pages."""
+        candidates = {}
+        for page_num in pages:
+            page = doc[page_num - 1]
+            has_rulings = count_rulings(page) >= LATTICE_MIN_RULINGS
+            has_columns = count_tabular_rows(page) >= STREAM_MIN_ROWS
+            if has_columns:
+                candidates[page_num] = ["stream", "lattice"] if has_rulings else ["stream"]
+            elif has_rulings:
+                candidates[page_num] = ["lattice"]
+        return candidates
+
+    def _read(self, load_path: Path, flavor: str, pages: list[int]) -> dict[int, list]:
+        if not pages:
+            return {}
+        tables = camelot.read_pdf(
+            str(load_path), flavor=flavor, pages=format_page_spec(pages)
+        )
+        by_page = defaultdict(list)
+        for table in tables:
+            by_page[int(table.page)].append(table)
+        return by_page
+
+    def extract(self, load_path: Path, pages: Optional[Iterable[int]] = None) -> dict[int, list[str]]:
+        """Extract tables per page.
+
+        Args:
+            load_path (Path): path of the pdf
+            pages (Iterable[int] | None): 1-based page numbers, all pages if None
+
+        Returns:
+            dict[int, list[str]]: page number -> text of each table on the page
+        """
+        with fitz.open(str(load_path)) as doc:
+            if pages is None:
+                pages = range(1, doc.page_count + 1)
+            pages = list(pages)
+            candidates = self.detect_table_pages(doc, pages)
+
+        found = {}
+        pending = dict(candidates)
+        # first pass runs each page's preferred flavor, the second pass only
+        # runs the fallback flavor for pages that still have no tables
+        for attempt in range(2):
+            by_flavor = defaultdict(list)
+            for page, flavors in pending.items():
+                if attempt < len(flavors):
+                    by_flavor[flavors[attempt]].append(page)
+            for flavor, flavor_pages in by_flavor.items():
+                for page, tables in self._read(load_path, flavor, flavor_pages).items():
+                    if page not in pending:
+                        continue
+                    found[page] = tables
+                    pending.pop(page)
+
+        pagewise_tables = {}
+        for page in sorted(found):
+            table_texts = []
+            for table in found[page]:
+                if table.df is None:
+                    continue
+                df = clean_table_df(table.df)
+                table_texts.append(df.to_string(index=False, header=True))
+            if table_texts:
+                pagewise_tables[page] = table_texts
+        print(
+            f"Table pre-filter: {len(candidates)}/{len(pages)} candidate pages, "
+            f"{len(pagewise_tables)} with tables"
+        )
+        return pagewise_tables
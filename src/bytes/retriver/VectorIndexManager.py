@@ -0,0 +1,149 @@
+from bytes.database.db import DBManager
+from sqlalchemy import text
+
+EMBEDDING_TABLE = "langchain_pg_embedding"
+FULLTEXT_INDEX = "ix_docstore_content_tsv"
+ANN_INDEX_NAMES = {"hnsw": "ix_embedding_hnsw", "ivfflat": "ix_embedding_ivfflat"}
+# btree indexes used by the thread / document metadata filters
+METADATA_INDEXES = {
+    "ix_embedding_collection_id": "(collection_id)",
+    "ix_embedding_custom_id": "(custom_id)",
+    "ix_embedding_doc_name": "((cmetadata->>'doc_name'))",
+    "ix_embedding_thread_id": "((cmetadata->>'thread_id'))",
+}
+
+
+class VectorIndexManager:
+    """Creates and maintains the ANN and metadata indexes of the PGVector tables.
+
+    Retrieval filters on doc_name (or thread_id for legacy chunks). With
+    the btree expression indexes the planner can scan only those rows and
+    sort them exactly for small threads, and use the HNSW/IVFFlat index with
+    the filter applied afterwards for large ones.
+    """
+
+    def __init__(self, db_manager: DBManager, dimensions: int) -> None:
+        self.db_manager = db_manager
+        self.dimensions = dimensions
+
+    def ensure_dimensions(self, session) -> None:
+        """ANN indexes need a typed vector(n) column, PGVector creates an untyped one."""
+        column_type = session.execute(
+            text(
+                """
+                SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+                WHERE attrelid = CAST(:table AS regclass) AND attname = 'embedding'
+                """
+            ),
+            {"table": EMBEDDING_TABLE},
+        ).scalar()
+        if column_type == "vector":
+            session.execute(
+                text(
+                    f"ALTER TABLE {EMBEDDING_TABLE} ALTER COLUMN embedding "
+                    f"TYPE vector({int(self.dimensions)})"
+                )
+            )
+
+    def build(
+        self,
+        method: str = "hnsw",
+        m: int = 16,
+        ef_construction: int = 64,
+        lists: int = 100,
+    ) -> list[str]:
+        """Create the ANN index and the metadata indexes if they do not exist.
+
+        Returns:
+            list[str]: names of the indexes that were ensured
+        """
+        if method not in ANN_INDEX_NAMES:
+            raise ValueError(f"Unknown index method {method}, use one of {list(ANN_INDEX_NAMES)}")
+        if method == "hnsw":
+            options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+        else:
+            options = f"lists = {int(lists)}"
+        with self.db_manager.session() as session:
+            self.ensure_dimensions(session)
+            session.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS {ANN_INDEX_NAMES[method]} ON {EMBEDDING_TABLE} "
+                    f"USING {method} (embedding vector_cosine_ops) WITH ({options})"
+                )
+            )
+            for name, expression in METADATA_INDEXES.items():
+                session.execute(
+                    text(f"CREATE INDEX IF NOT EXISTS {name} ON {EMBEDDING_TABLE} {expression}")
+                )
+            self.ensure_fulltext(session)
+            session.execute(text(f"ANALYZE {EMBEDDING_TABLE}"))
+        return [ANN_INDEX_NAMES[method], *METADATA_INDEXES, FULLTEXT_INDEX]
+
+    def has_fulltext(self, session) -> bool:
+        return session.execute(
+            text(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = 'docstore' AND column_name = 'content_tsv'"
+            )
+        ).scalar() is not None
+
+    def ensure_fulltext(self, session) -> None:
+        """Add the generated tsvector column and its GIN index to older docstore tables."""
+        if session.execute(text("SELECT to_regclass('docstore')")).scalar() is None:
+            # create_all makes a new docstore with the column and index
+            return
+        if not self.has_fulltext(session):
+            # rewrites the table once, computing the column for every chunk
+            print("Adding docstore.content_tsv for full-text search")
+            session.execute(
+                text(
+                    "ALTER TABLE docstore ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+                    "GENERATED ALWAYS AS (to_tsvector('english', content)) STORED"
+                )
+            )
+        session.execute(
+            text(f"CREATE INDEX IF NOT EXISTS {FULLTEXT_INDEX} ON docstore USING gin (content_tsv)")
+        )
+
+    def rebuild(self) -> list[str]:
+        """REINDEX every existing index managed here, e.g. after a bulk load."""
+        rebuilt = []
+        with self.db_manager.session() as session:
+            for name in self.existing_indexes(session):
+                session.execute(text(f"REINDEX INDEX {name}"))
+                rebuilt.append(name)
+            session.execute(text(f"ANALYZE {EMBEDDING_TABLE}"))
+        return rebuilt
+
+    def drop(self, method: str | None = None) -> None:
+        names = [ANN_INDEX_NAMES[method]] if method else list(ANN_INDEX_NAMES.values())
+        with self.db_manager.session() as session:
+            for name in names:
+                session.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+    def existing_indexes(self, session) -> list[str]:
+        managed = [*ANN_INDEX_NAMES.values(), *METADATA_INDEXES]
+        rows = session.execute(
+            text("SELECT indexname FROM pg_indexes WHERE tablename = :table"),
+            {"table": EMBEDDING_TABLE},
+        ).all()
+        return [row.indexname for row in rows if row.indexname in managed]
+
+    def status(self) -> list[dict]:
+        with self.db_manager.session() as session:
+            rows = session.execute(
+                text(
+                    """
+                    SELECT i.indexname, i.indexdef,
+                           pg_size_pretty(pg_relation_size(CAST(i.indexname AS regclass))) AS size
+                    FROM pg_indexes i
+                    WHERE i.tablename = :table
+                    ORDER BY i.indexname
+                    """
+                ),
+                {"table": EMBEDDING_TABLE},
+            ).all()
+        return [
+            {"name": row.indexname, "size": row.size, "definition": row.indexdef}
+            for row in rows
+        ]
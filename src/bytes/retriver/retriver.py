@@ -1,19 +1,215 @@
-import base64
+import json
+import math
+import multiprocessing
+import os
+import re
+import sys
 import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
 # import faiss
 from pathlib import Path
+from typing import Callable
 
-import camelot
 import fitz  # PyMuPDF
-import pandas as pd
 from bytes.database.db import DBManager
+from bytes.database.models import EMBEDDING_DIMENSIONS
+from bytes.retriver.CachedEmbeddings import CachedEmbeddings
+from bytes.retriver.CrossEncoderReranker import CrossEncoderReranker
+from bytes.retriver.DocumentRegistry import DocumentRegistry, file_digest, text_digest
+from bytes.retriver.LRUCache import LRUCache
+from bytes.retriver.HybridSearch import LexicalSearch, reciprocal_rank_fusion
+from bytes.retriver.MmapVectorIndex import MmapVectorIndex
+from bytes.retriver.PageImageCache import PageImageCache
 from bytes.retriver.PostgresDocStore import PostgresDocStore
+from bytes.retriver.RetrievalCache import MemoryBackend, RetrievalCache, SqliteBackend
+from bytes.retriver.TableExtractor import TableExtractor
+from bytes.retriver.VectorIndexManager import EMBEDDING_TABLE, VectorIndexManager
 from langchain.retrievers.multi_vector import MultiVectorRetriever
 from langchain.schema.document import Document
 from langchain_community.vectorstores.pgvector import PGVector
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
+from sqlalchemy import insert, text
+from sqlalchemy.exc import SQLAlchemyError
+
+COLLECTION_NAME = "multi_modal_rag"
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# search breadth of the ANN indexes, applied to every vectorstore connection
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "100"))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+# "vector" or "hybrid" (vector + full-text, fused with reciprocal rank fusion)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+# each side of a hybrid search fetches k * factor candidates before fusion
+HYBRID_FETCH_FACTOR = 3
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "8"))
+# "pgvector" or "mmap" (local memory-mapped index, synced from Postgres)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pgvector")
+VECTOR_INDEX_DIR = Path(os.getenv("VECTOR_INDEX_DIR", ".cache/vector_index"))
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "int8")
+# "torch" (sentence-transformers) or "onnx"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_MODEL_DIR = Path(os.getenv("ONNX_MODEL_DIR", f".cache/onnx/{EMBEDDING_MODEL}"))
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "false").lower() == "true"
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0")) or None
+DEFAULT_INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+# forking a process with torch and the ingest/search threads running can deadlock
+INGEST_START_METHOD = "spawn" if sys.platform == "win32" else "forkserver"
+MAX_SLICE_PAGES = 16
+BULK_WRITE_BATCH_SIZE = 1000
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "uploads"))
+PAGE_IMAGE_CACHE_DIR = Path(os.getenv("PAGE_IMAGE_CACHE_DIR", ".cache/page_images"))
+PAGE_IMAGE_CACHE_MB = int(os.getenv("PAGE_IMAGE_CACHE_MB", "256"))
+# render every page image at ingestion instead of on first request
+INGEST_RENDER_IMAGES = os.getenv("INGEST_RENDER_IMAGES", "false").lower() == "true"
+# doc_ids are {doc_name}_page_{page}_chunk_{j} or {doc_name}_page_{page}_table_{k}
+DOC_ID_PATTERN = re.compile(r"^(?P<doc_name>.+)_page_(?P<page>\d+)_(?P<kind>chunk|table)_(?P<index>\d+)$")
+# table keys probed per page by get_excerpt
+EXCERPT_MAX_TABLES = 8
+EXCERPT_CACHE_SIZE = 4096
+# share of identical pages for an upload with a known name to count as a new revision
+REVISION_MIN_SHARED_PAGES = 0.5
+
+# cross-encoder rerank stage, see Retriver.retrive_reranked
+RERANK = os.getenv("RERANK", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+RERANK_BUDGET_MS = int(os.getenv("RERANK_BUDGET_MS", "300"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+# "memory" (per worker), "sqlite" (shared by the workers of a host) or "off"
+RETRIEVAL_CACHE = os.getenv("RETRIEVAL_CACHE", "memory")
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "2048"))
+RETRIEVAL_CACHE_PATH = Path(os.getenv("RETRIEVAL_CACHE_PATH", ".cache/retrieval_cache.sqlite3"))
+
+
+def load_embedding_backend():
+    """Build the embedding model selected by EMBEDDING_BACKEND.
+
+    Returns:
+        tuple: (embeddings, model name used to key the embedding cache).
+        int8 vectors differ slightly from the float model so they are cached
+        under their own name.
+    """
+    if EMBEDDING_BACKEND == "onnx":
+        from bytes.retriver.OnnxEmbeddings import OnnxEmbeddings
+
+        embeddings = OnnxEmbeddings(
+            ONNX_MODEL_DIR, quantized=ONNX_QUANTIZED, threads=EMBEDDING_THREADS
+        )
+        return embeddings, f"{EMBEDDING_MODEL}:int8" if ONNX_QUANTIZED else EMBEDDING_MODEL
+    if EMBEDDING_BACKEND != "torch":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {EMBEDDING_BACKEND}")
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL), EMBEDDING_MODEL
+
+
+def load_retrieval_cache() -> RetrievalCache | None:
+    if RETRIEVAL_CACHE == "off":
+        return None
+    if RETRIEVAL_CACHE == "sqlite":
+        backend = SqliteBackend(RETRIEVAL_CACHE_PATH, maxsize=RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL)
+    elif RETRIEVAL_CACHE == "memory":
+        backend = MemoryBackend(maxsize=RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL)
+    else:
+        raise ValueError(f"Unknown RETRIEVAL_CACHE {RETRIEVAL_CACHE}, use memory, sqlite or off")
+    return RetrievalCache(backend)
+
+
+def to_float_list(embedding) -> list[float]:
+    """pgvector values come back as "[..]" strings or arrays depending on the driver setup."""
+    if isinstance(embedding, str):
+        embedding = json.loads(embedding)
+    return [float(x) for x in embedding]
+
+
+def get_text_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=900,
+        chunk_overlap=50,
+        separators=["\n\n", "\n", ".", " "]
+    )
+
+
+table_extractor = TableExtractor()
+
+
+def extract_tables(load_path: Path, pages=None) -> dict:
+    """Extract camelot tables per page, see TableExtractor.extract."""
+    return table_extractor.extract(load_path, pages=pages)
+
+
+def build_page_documents(
+    doc, doc_name: str, table_map: dict, thread_id: int = 0, pages=None
+) -> list[Document]:
+    """Split page text and tables into Documents.
+
+    Args:
+        doc: open fitz document
+        doc_name (str): prefix of the doc_ids
+        table_map (dict): page number -> list of table texts
+        thread_id (int): thread the chunks belong to
+        pages (Iterable[int] | None): 1-based page numbers, all pages if None
+    """
+    documents = []
+    text_splitter = get_text_splitter()
+    if pages is None:
+        pages = range(1, doc.page_count + 1)
+    for page_num in pages:
+        page = doc[page_num - 1]
+        text = page.get_text()
+        tables = table_map.get(page_num, [])
+        if isinstance(tables, str):
+            tables = [tables]
+
+        chunks = text_splitter.split_text(text)
+        for j,chunk in enumerate(chunks):
+            if(len(chunk.strip("\n").strip(" "))<1):
+                continue
+            metadata = {
+            "doc_id": f"{doc_name}_page_{page_num}_chunk_{j}",
+            "page_number": page_num,
+            "doc_name": doc_name,
+            "thread_id":thread_id
+            }
+            documents.append(Document(page_content=chunk, metadata=metadata))
+        if(tables):
+            for k, table in enumerate(tables):
+                if(len(table.strip("\n").strip(" "))>1):
+                    documents.append(Document(
+                        page_content=f"---TABLE---\n{table}",
+                        metadata={
+                            "doc_id": f"{doc_name}_page_{page_num}_table_{k}",
+                            "page_number": page_num,
+                            "table_number": k,
+                            "doc_name": doc_name,
+                            "thread_id": thread_id
+                        }
+                    ))
+    return documents
+
+
+def split_pages(pages: list[int], workers: int) -> list[list[int]]:
+    """Split page numbers into contiguous slices for the worker pool.
+
+    A few slices per worker keep the pool busy when some pages (tables)
+    are much slower than others, and bound how often progress is reported.
+    """
+    n_slices = min(len(pages), max(workers, 1) * 4)
+    size = min(math.ceil(len(pages) / n_slices), MAX_SLICE_PAGES)
+    return [pages[i:i + size] for i in range(0, len(pages), size)]
+
+
+def process_pages(
+    load_path: str, doc_name: str, pages: list[int], thread_id: int = 0
+) -> list[Document]:
+    """Worker entry point: extract and chunk the given pages."""
+    table_map = extract_tables(Path(load_path), pages=pages)
+    with fitz.open(load_path) as doc:
+        return build_page_documents(doc, doc_name, table_map, thread_id=thread_id, pages=pages)
+
+
 class Retriver:
     _instance = None
     _lock = threading.Lock()
@@ -29,142 +225,658 @@ class Retriver:
     def __init__(self) -> None:
         if hasattr(self, "vectorstore"):
             return
-        self.embedding_function = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
         self.db_instance = DBManager()
+        base_embeddings, cache_model_name = load_embedding_backend()
+        self.embedding_function = CachedEmbeddings(
+            base_embeddings,
+            model_name=cache_model_name,
+            db_manager=self.db_instance,
+        )
         self.vectorstore = PGVector(
             connection_string=self.db_instance.db_url,
-            collection_name="multi_modal_rag",
+            collection_name=COLLECTION_NAME,
             embedding_function=self.embedding_function,
+            embedding_length=EMBEDDING_DIMENSIONS,
+            engine_args={
+                "connect_args": {
+                    # iterative_scan (pgvector >= 0.8) keeps scanning the HNSW
+                    # graph until enough rows pass the thread filter
+                    "options": f"-c hnsw.ef_search={HNSW_EF_SEARCH} "
+                    f"-c hnsw.iterative_scan=relaxed_order -c ivfflat.probes={IVFFLAT_PROBES}"
+                }
+            },
+        )
+        self.index_manager = VectorIndexManager(self.db_instance, dimensions=EMBEDDING_DIMENSIONS)
+        self.lexical_search = LexicalSearch(self.db_instance, collection_name=COLLECTION_NAME)
+        self.fulltext_ready = self.check_fulltext()
+        self.search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+        self.mmap_index = (
+            MmapVectorIndex(VECTOR_INDEX_DIR, dtype=VECTOR_INDEX_DTYPE)
+            if VECTOR_BACKEND == "mmap"
+            else None
         )
         self.docstore = PostgresDocStore(db_manager=self.db_instance)
+        self.registry = DocumentRegistry(db_manager=self.db_instance)
         self.retriever = MultiVectorRetriever(
             vectorstore=self.vectorstore, docstore=self.docstore, id_key="doc_id"
         )
+        self.page_images = PageImageCache(
+            cache_dir=PAGE_IMAGE_CACHE_DIR,
+            source_dir=UPLOAD_DIR,
+            max_bytes=PAGE_IMAGE_CACHE_MB * 1024 * 1024,
+        )
+        self.retrieval_cache = load_retrieval_cache()
+        self.excerpts = LRUCache(maxsize=EXCERPT_CACHE_SIZE)
+        self.reranker = (
+            CrossEncoderReranker(
+                RERANK_MODEL,
+                max_candidates=RERANK_CANDIDATES,
+                budget_seconds=RERANK_BUDGET_MS / 1000,
+                batch_size=RERANK_BATCH_SIZE,
+            )
+            if RERANK
+            else None
+        )
+        self.thread_listeners: list[Callable[[int], None]] = []
 
-    def extract_tables_by_page(self, load_path: Path, doc_name: str):
-        pagewise_tables = {}
-        for i in range(1, fitz.open(load_path).page_count + 1):
-            page_tables = camelot.read_pdf(
-                str(load_path), flavor="stream", pages=str(i)
+    def check_fulltext(self) -> bool:
+        """Whether the docstore has the full-text column hybrid retrieval needs.
+
+        Read-only, older docstore tables get the column from `bytes build-index`.
+        """
+        try:
+            with self.db_instance.session() as session:
+                ready = self.index_manager.has_fulltext(session)
+        except SQLAlchemyError as e:
+            print(f"Full-text search unavailable, hybrid retrieval falls back to vector search: {e}")
+            return False
+        if not ready and RETRIEVAL_MODE == "hybrid":
+            print(
+                "docstore has no content_tsv column, run `bytes build-index`; "
+                "hybrid retrieval falls back to vector search"
             )
-            if len(page_tables) == 0:
-                page_tables = camelot.read_pdf(
-                    str(load_path), flavor="lattice", pages=str(i)
-                )
-            table_texts = []
-            for table in page_tables:
-                if table.df is None:
-                    continue
-                print(table.df)
-
-                df = table.df.apply(
-                    lambda col: col.map(
-                        lambda x: x.strip() if isinstance(x, str) else x
-                    )
-                )
-                df = (
-                    df.replace(["", "nan", "NaN", "NULL"], pd.NA)
-                    .dropna(how="all")
-                    .fillna("")
-                )
-                table_texts.append(df.to_string(index=False, header=True))
+        return ready
 
-            if table_texts:
-                pagewise_tables[i] = "\n\n".join(table_texts)
+    def extract_tables_by_page(self, load_path: Path, doc_name: str, pages=None):
+        return extract_tables(load_path, pages=pages)
 
-        return pagewise_tables
+    def extract_images_by_page(self, doc, doc_name) -> dict:
+        """Render every page into the page image cache.
 
-    def extract_images_by_page(self, doc, doc_name):
-        image_b64_by_page = {}
-        for i, page in enumerate(doc):
-            print(f"Extracting image from page {i+1}")
-            pix = page.get_pixmap()
-            image_b64 = base64.b64encode(pix.tobytes("jpeg")).decode("utf-8")
-            image_b64_by_page[i + 1] = image_b64
-        return image_b64_by_page
+        Images are written to disk one page at a time, only paths are kept.
+        Pages are otherwise rendered on demand through page_images.get.
+        """
+        return {
+            i + 1: self.page_images.get(doc_name, i + 1, doc=doc)
+            for i in range(doc.page_count)
+        }
 
     def build_combined_pagewise_docs(
-        self, doc, doc_name: str, table_map: dict, image_map: dict,thread_id:int=0,
+        self, doc, doc_name: str, table_map: dict, image_map: dict|None=None,thread_id:int=0,
     ):
+        return build_page_documents(doc, doc_name, table_map, thread_id=thread_id)
+
+    def batch_add_documents(self, documents, batch_size=BULK_WRITE_BATCH_SIZE):
+        return self.bulk_add_documents(documents, batch_size=batch_size)
+
+    def bulk_add_documents(self, documents: list[Document], batch_size: int = BULK_WRITE_BATCH_SIZE) -> dict:
+        """Embed documents and write vectors and docstore rows in one transaction."""
+        if not documents:
+            return {"rows": 0, "embed_seconds": 0.0, "write_seconds": 0.0, "rows_per_sec": 0.0}
+        start = time.perf_counter()
+        texts = [doc.page_content for doc in documents]
+        embeddings = self.embedding_function.embed_documents(texts)
+        embed_seconds = time.perf_counter() - start
+        stats = self.write_embeddings(
+            texts, embeddings, [doc.metadata for doc in documents], batch_size=batch_size
+        )
+        stats["embed_seconds"] = round(embed_seconds, 3)
+        return stats
+
+    def write_embeddings(
+        self,
+        texts: list[str],
+        embeddings: list[list[float]],
+        metadatas: list[dict],
+        batch_size: int = BULK_WRITE_BATCH_SIZE,
+    ) -> dict:
+        """Bulk write precomputed embeddings and their docstore rows.
+
+        Rows with the same doc_id (custom_id) are replaced. Vectors go in
+        with multi-row INSERTs and the docstore with INSERT ... ON CONFLICT,
+        all inside a single transaction.
+
+        Returns:
+            dict: rows written, seconds and rows/sec
+        """
+        start = time.perf_counter()
+        embedding_store = self.vectorstore.EmbeddingStore
+        ids = [metadata["doc_id"] for metadata in metadatas]
+        self.excerpts.clear()
+        with self.db_instance.session() as session:
+            collection = self.vectorstore.get_collection(session)
+            if collection is None:
+                raise ValueError(f"Collection {COLLECTION_NAME} not found")
+            for i in range(0, len(ids), batch_size):
+                session.query(embedding_store).filter(
+                    embedding_store.collection_id == collection.uuid,
+                    embedding_store.custom_id.in_(ids[i:i + batch_size]),
+                ).delete(synchronize_session=False)
+            for i in range(0, len(ids), batch_size):
+                rows = [
+                    {
+                        "uuid": uuid.uuid4(),
+                        "collection_id": collection.uuid,
+                        "embedding": embedding,
+                        "document": text_,
+                        "cmetadata": metadata,
+                        "custom_id": doc_id,
+                    }
+                    for text_, embedding, metadata, doc_id in zip(
+                        texts[i:i + batch_size],
+                        embeddings[i:i + batch_size],
+                        metadatas[i:i + batch_size],
+                        ids[i:i + batch_size],
+                    )
+                ]
+                session.execute(insert(embedding_store).values(rows))
+            self.docstore.upsert(session, list(zip(ids, texts)))
+        if self.mmap_index is not None:
+            by_doc = {}
+            for embedding, metadata in zip(embeddings, metadatas):
+                vectors, segment_metadatas = by_doc.setdefault(metadata["doc_name"], ([], []))
+                vectors.append(embedding)
+                segment_metadatas.append(metadata)
+            for doc_name, (vectors, segment_metadatas) in by_doc.items():
+                self.mmap_index.append(doc_name, vectors, segment_metadatas)
+        elapsed = time.perf_counter() - start
+        rows_per_sec = len(ids) / elapsed if elapsed > 0 else 0.0
+        print(f"Wrote {len(ids)} vectors + docstore rows in {elapsed:.2f}s ({rows_per_sec:.0f} rows/sec)")
+        return {
+            "rows": len(ids),
+            "write_seconds": round(elapsed, 3),
+            "rows_per_sec": round(rows_per_sec, 1),
+        }
+
+    def extract_pages(
+        self,
+        load_path: Path,
+        doc_name: str,
+        pages: list[int],
+        thread_id: int = 0,
+        workers: int = 1,
+        on_pages: Callable[[int], None] | None = None,
+    ) -> list[Document]:
+        """Extract and chunk the given pages, on a process pool if workers > 1.
+
+        on_pages is called with the number of pages finished after every slice.
+        """
+        if not pages:
+            return []
+        if workers > 1 and len(pages) > 1:
+            return self.parse_parallel(
+                load_path, doc_name, pages, thread_id=thread_id, workers=workers, on_pages=on_pages
+            )
         documents = []
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=900,
-            chunk_overlap=50,
-            separators=["\n\n", "\n", ".", " "]
-        )
-        for i, page in enumerate(doc):
-            print("Processing page", i + 1)
-            page_num = i + 1
-            text = page.get_text()
-            tables = table_map.get(page_num, "")
-
-            chunks = text_splitter.split_text(text)
-            for j,chunk in enumerate(chunks):
-                if(len(chunk.strip("\n").strip(" "))<1):
-                    continue
-                metadata = {
-                "doc_id": f"{doc_name}_page_{page_num}_chunk_{j}",
-                "page_number": page_num,
-                "doc_name": doc_name,
-                "thread_id":thread_id
-                }
-                print("page;",page_num,"chunk:",j,"content:",chunk)
-                documents.append(Document(page_content=chunk, metadata=metadata))
-            if(tables):
-                for k, table in enumerate(tables):
-                    if(len(table.strip("\n").strip(" "))>1):
-                        print(table,"k:",k,"page_num:",page_num)
-                        documents.append(Document(
-                            page_content=f"---TABLE---\n{table}",
-                            metadata={
-                                "doc_id": f"{doc_name}_page_{page_num}_table_{k}",
-                                "page_number": page_num,
-                                "table_number": k,
-                                "doc_name": doc_name,
-                                "thread_id": thread_id
-                            }
-                        ))
-        print(len(documents))
+        with fitz.open(str(load_path)) as doc:
+            for page_slice in split_pages(pages, 1):
+                table_map = self.extract_tables_by_page(load_path, doc_name, pages=page_slice)
+                documents.extend(
+                    build_page_documents(doc, doc_name, table_map, thread_id=thread_id, pages=page_slice)
+                )
+                if on_pages is not None:
+                    on_pages(len(page_slice))
         return documents
-    def batch_add_documents(self, documents, batch_size=50):
-        print(len(documents))
 
-        for i in range(0, len(documents), batch_size):
-            if(documents[i:i+batch_size]==[]):
-                continue
-            print("i:",i)
-            batch = documents[i:i+batch_size]
+    def parse(
+        self,
+        load_path: Path,
+        thread_id:int=0,
+        workers:int|None=None,
+        render_images:bool|None=None,
+        source_name:str|None=None,
+        progress:Callable[[int, int], None]|None=None,
+    ) -> dict:
+        """Parse a pdf and index its chunks.
 
-            print(f"Inserting batch {i} - {i + batch_size}...")
-            self.vectorstore.add_documents(batch)
+        A file whose content hash is already indexed is only linked to the
+        thread. A new revision of a document already in the thread (same
+        source_name and at least REVISION_MIN_SHARED_PAGES identical pages)
+        replaces it and only re-chunks and re-embeds the pages whose text
+        changed, the embeddings of unchanged pages are copied over. Any
+        other upload is added next to the thread's documents.
 
-    def parse(self, load_path: Path,  thread_id:int=0):
-        doc = fitz.open(str(load_path))
+        Args:
+            load_path (Path): path of the pdf
+            thread_id (int): thread the chunks belong to
+            workers (int | None): size of the process pool used for page-level
+                extraction, defaults to INGEST_WORKERS. 1 runs serially.
+            render_images (bool | None): pre-render page images into the page image
+                cache, otherwise they are rendered lazily on first request.
+                Defaults to INGEST_RENDER_IMAGES.
+            source_name (str | None): original file name, used to detect revisions
+            progress (Callable[[int, int], None] | None): called with
+                (pages_done, pages_total) as pages are processed, may raise
+                to abort the ingestion. The call with pages_done == pages_total
+                comes last, before anything is written or linked.
+
+        Returns:
+            dict: ingestion stats (doc_name, pages, documents, seconds, pages_per_sec, ...)
+        """
+        start = time.perf_counter()
         doc_name = load_path.stem
+        workers = workers if workers is not None else DEFAULT_INGEST_WORKERS
+        render_images = render_images if render_images is not None else INGEST_RENDER_IMAGES
+        source_name = source_name or load_path.name
+        file_hash = file_digest(load_path)
+
+        existing = self.registry.get_by_hash(file_hash)
+        if existing is not None:
+            if progress is not None:
+                progress(0, 0)
+            self.registry.link(thread_id, existing)
+            self.invalidate_thread(thread_id)
+            print(f"{source_name} already indexed as {existing}, linked to thread {thread_id}")
+            return {
+                "doc_name": existing,
+                "deduplicated": True,
+                "pages": 0,
+                "documents": 0,
+                "reused_documents": 0,
+                "embedded_pages": 0,
+                "workers": max(workers, 1),
+                "seconds": round(time.perf_counter() - start, 3),
+                "pages_per_sec": 0.0,
+            }
+
+        with fitz.open(str(load_path)) as doc:
+            page_count = doc.page_count
+            page_hashes = [text_digest(page.get_text()) for page in doc]
+
+        previous = self.registry.find_revision(
+            thread_id, source_name, page_hashes, min_shared=REVISION_MIN_SHARED_PAGES
+        )
+        reuse_pages = []
+        if previous is not None:
+            previous_hashes = self.registry.page_hashes(previous)
+            reuse_pages = [
+                i + 1 for i, text_hash in enumerate(page_hashes)
+                if previous_hashes.get(i + 1) == text_hash
+            ]
+        changed_pages = sorted(set(range(1, page_count + 1)) - set(reuse_pages))
+
+        pages_done = len(reuse_pages)
+
+        def on_pages(n_pages: int) -> None:
+            nonlocal pages_done
+            pages_done += n_pages
+            if progress is not None:
+                progress(pages_done, page_count)
+
+        on_pages(0)
+        combined_docs = self.extract_pages(
+            load_path, doc_name, changed_pages, thread_id=thread_id, workers=workers, on_pages=on_pages
+        )
+        if render_images:
+            with fitz.open(str(load_path)) as doc:
+                self.extract_images_by_page(doc, doc_name)
+        extracted = time.perf_counter()
+
+        write_stats = self.bulk_add_documents(combined_docs)
+        reused = 0
+        if reuse_pages:
+            reused = self.copy_page_documents(previous, doc_name, reuse_pages, thread_id=thread_id)
+
+        owner = self.registry.register(doc_name, file_hash, page_hashes, source_name=source_name)
+        deduplicated = owner != doc_name
+        if deduplicated:
+            # the same file was indexed concurrently and registered first
+            print(f"{source_name} was indexed concurrently as {owner}, dropping {doc_name}")
+            self.delete_document(doc_name)
+            doc_name = owner
+        if previous is not None and previous != doc_name:
+            self.registry.unlink(thread_id, previous)
+        self.registry.link(thread_id, doc_name)
+        self.invalidate_thread(thread_id)
 
-        table_map = self.extract_tables_by_page(load_path, doc_name)
-        image_map = self.extract_images_by_page(doc, doc_name)
-        combined_docs = self.build_combined_pagewise_docs(
-            doc, doc_name, table_map, image_map,thread_id=thread_id
+        elapsed = time.perf_counter() - start
+        stats = {
+            "doc_name": doc_name,
+            "deduplicated": deduplicated,
+            "pages": page_count,
+            "documents": len(combined_docs) + reused,
+            "reused_documents": reused,
+            "embedded_pages": len(changed_pages),
+            "workers": max(workers, 1),
+            "extract_seconds": round(extracted - start, 3),
+            "seconds": round(elapsed, 3),
+            "pages_per_sec": round(page_count / elapsed, 2) if elapsed > 0 else 0.0,
+            "write_rows_per_sec": write_stats["rows_per_sec"],
+            "embedding_cache": self.embedding_function.stats(),
+        }
+        print(
+            f"Indexed {doc_name}: {page_count} pages ({len(changed_pages)} embedded, "
+            f"{len(reuse_pages)} reused from {previous}), {stats['documents']} chunks "
+            f"in {elapsed:.2f}s ({stats['pages_per_sec']} pages/sec, {stats['workers']} workers)"
         )
+        return stats
 
-        self.batch_add_documents(combined_docs)
+    def parse_parallel(
+        self,
+        load_path: Path,
+        doc_name: str,
+        pages: list[int],
+        thread_id: int = 0,
+        workers: int = 2,
+        on_pages: Callable[[int], None] | None = None,
+    ) -> list[Document]:
+        """Extract text, tables and chunks for page slices on a process pool.
 
-        self.docstore.mset(
-            [(doc.metadata["doc_id"], doc.page_content) for doc in combined_docs]
+        The results are merged back in page order, so doc_ids are identical
+        to the serial path.
+        """
+        page_slices = split_pages(pages, workers)
+        results = {}
+        pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context(INGEST_START_METHOD)
         )
+        try:
+            futures = {
+                pool.submit(
+                    process_pages, str(load_path), doc_name, page_slice, thread_id
+                ): i
+                for i, page_slice in enumerate(page_slices)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                if on_pages is not None:
+                    on_pages(len(page_slices[i]))
+        finally:
+            # drop queued slices when a slice fails or progress aborts the run
+            pool.shutdown(wait=True, cancel_futures=True)
+        documents = []
+        for i in range(len(page_slices)):
+            documents.extend(results[i])
+        return documents
+
+    def copy_page_documents(
+        self, source_doc: str, target_doc: str, pages: list[int], thread_id: int = 0
+    ) -> int:
+        """Copy the stored chunks and embeddings of unchanged pages to a new revision.
+
+        Returns:
+            int: number of chunks copied
+        """
+        pages = set(pages)
+        with self.db_instance.session() as session:
+            rows = session.execute(
+                text(
+                    """
+                    SELECT e.document, e.embedding, e.cmetadata
+                    FROM langchain_pg_embedding e
+                    JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+                    WHERE c.name = :collection AND e.cmetadata->>'doc_name' = :doc_name
+                    """
+                ),
+                {"collection": COLLECTION_NAME, "doc_name": source_doc},
+            ).all()
+
+        texts, embeddings, metadatas = [], [], []
+        for document, embedding, metadata in rows:
+            if int(metadata.get("page_number", 0)) not in pages:
+                continue
+            metadata = dict(metadata)
+            metadata["doc_id"] = target_doc + metadata["doc_id"][len(source_doc):]
+            metadata["doc_name"] = target_doc
+            metadata["thread_id"] = thread_id
+            texts.append(document)
+            embeddings.append(to_float_list(embedding))
+            metadatas.append(metadata)
+
+        if texts:
+            self.write_embeddings(texts, embeddings, metadatas)
+        return len(texts)
+
+    def delete_document(self, doc_name: str) -> int:
+        """Delete the stored chunks, embeddings and local index segment of a document.
+
+        Returns:
+            int: number of chunks deleted
+        """
+        with self.db_instance.session() as session:
+            doc_ids = session.execute(
+                text(
+                    """
+                    DELETE FROM langchain_pg_embedding e
+                    USING langchain_pg_collection c
+                    WHERE c.uuid = e.collection_id
+                      AND c.name = :collection AND e.cmetadata->>'doc_name' = :doc_name
+                    RETURNING e.custom_id
+                    """
+                ),
+                {"collection": COLLECTION_NAME, "doc_name": doc_name},
+            ).scalars().all()
+        if doc_ids:
+            self.docstore.mdelete(doc_ids)
+        if self.mmap_index is not None:
+            self.mmap_index.delete_segment(doc_name)
+        self.excerpts.clear()
+        return len(doc_ids)
+
+    def cache_stats(self) -> dict:
+        stats = {"embedding_cache": self.embedding_function.stats()}
+        if self.retrieval_cache is not None:
+            stats["retrieval_cache"] = self.retrieval_cache.stats()
+        if self.reranker is not None:
+            stats["reranker"] = self.reranker.stats()
+        return stats
+
+    def add_thread_listener(self, listener: Callable[[int], None]) -> None:
+        """Register a callback run with the thread_id whenever its documents change."""
+        self.thread_listeners.append(listener)
+
+    def invalidate_thread(self, thread_id: int) -> None:
+        """Drop everything cached for a thread, call after its documents changed."""
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.invalidate_thread(thread_id)
+        for listener in self.thread_listeners:
+            listener(thread_id)
+
+    def thread_doc_names(self, thread_id: int) -> list[str]:
+        """Documents visible to a thread: its registry links and its pre-registry uploads."""
+        doc_names = self.registry.doc_names_for_thread(thread_id)
+        # chunks indexed before the document registry only carry thread_id
+        with self.db_instance.session() as session:
+            legacy = session.execute(
+                text(
+                    f"""
+                    SELECT DISTINCT e.cmetadata->>'doc_name'
+                    FROM {EMBEDDING_TABLE} e
+                    WHERE e.cmetadata->>'thread_id' = :thread_id
+                      AND e.cmetadata->>'doc_name' IS NOT NULL
+                      AND NOT EXISTS (
+                          SELECT 1 FROM indexed_document d WHERE d.doc_name = e.cmetadata->>'doc_name'
+                      )
+                    """
+                ),
+                {"thread_id": str(thread_id)},
+            ).scalars().all()
+        return doc_names + [name for name in legacy if name not in doc_names]
+
+    def thread_filter(self, thread_id: int, doc_names: list[str] | None = None) -> dict:
+        """PGVector metadata filter selecting the documents visible to a thread."""
+        if doc_names is None:
+            doc_names = self.thread_doc_names(thread_id)
+        return {"doc_name": {"in": doc_names}}
+
+    def get_excerpt(self, doc_id: str, thread_id: int | None = None, neighbours: int = 1) -> list[Document]:
+        """A chunk with its neighbouring chunks and the tables of its page, by key.
+
+        Fetches {doc_name}_page_{p}_chunk_{j-n..j+n} and the page's tables with
+        one docstore mget instead of a vector store search.
+
+        Args:
+            doc_id (str): chunk or table doc_id
+            thread_id (int | None): only return documents visible to this thread
+            neighbours (int): chunks to include on each side of the chunk
+
+        Returns:
+            list[Document]: chunks in page order followed by the page tables,
+                empty if the doc_id is unknown or not visible to the thread
+        """
+        match = DOC_ID_PATTERN.match(doc_id)
+        if match is None:
+            return []
+        doc_name, page = match["doc_name"], int(match["page"])
+        if thread_id is not None:
+            if doc_name not in self.thread_doc_names(thread_id):
+                return []
+
+        cache_key = (doc_id, neighbours)
+        cached = self.excerpts.get(cache_key)
+        if cached is not None:
+            return list(cached)
+
+        prefix = f"{doc_name}_page_{page}"
+        if match["kind"] == "chunk":
+            index = int(match["index"])
+            chunk_ids = [
+                f"{prefix}_chunk_{j}"
+                for j in range(max(index - neighbours, 0), index + neighbours + 1)
+            ]
+        else:
+            chunk_ids = []
+        table_ids = [f"{prefix}_table_{k}" for k in range(EXCERPT_MAX_TABLES)]
+        keys = chunk_ids + table_ids
+        if doc_id not in keys:
+            keys.append(doc_id)
+        contents = self.docstore.mget(keys)
+        if contents[keys.index(doc_id)] is None:
+            return []
+        documents = [
+            Document(
+                page_content=content,
+                metadata={"doc_id": key, "page_number": page, "doc_name": doc_name},
+            )
+            for key, content in zip(keys, contents)
+            if content is not None
+        ]
+        self.excerpts.put(cache_key, documents)
+        return list(documents)
 
-        # print("\n✅ All pages processed and indexed as unified per-page chunks.")
-        # docs = self.retriever.invoke("What is the revenue of the company in FY23?")
-        # print("📄 Retrieved documents:", docs)
     def delete_vectorstore(self):
         print("Deleting all data from vectorsotre database...")
         if_delete:bool =  bool(input("Are you sure? (1/0)"))
         if(if_delete):
             self.vectorstore.delete(delete_all=True)
 
-    def retrive(self,query:str,thread_id:int=0,k:int=10):
-        return self.retriever.vectorstore.similarity_search(query, k=k,filter={"thread_id":thread_id})
+    def vector_search(self, query: str, thread_id: int = 0, k: int = 10, doc_names: list[str] | None = None):
+        if self.mmap_index is not None:
+            if doc_names is None:
+                doc_names = self.thread_doc_names(thread_id)
+            # threads whose documents are all synced are served locally
+            if doc_names and all(self.mmap_index.has_segment(name) for name in doc_names):
+                return self.mmap_search(query, doc_names, k)
+        return self.vectorstore.similarity_search(
+            query, k=k, filter=self.thread_filter(thread_id, doc_names=doc_names)
+        )
+
+    def mmap_search(self, query: str, doc_names: list[str], k: int = 10) -> list[Document]:
+        hits = self.mmap_index.search(doc_names, self.embedding_function.embed_query(query), k)
+        contents = self.docstore.mget([metadata["doc_id"] for _, metadata in hits])
+        return [
+            Document(page_content=content, metadata=dict(metadata))
+            for (_, metadata), content in zip(hits, contents)
+            if content is not None
+        ]
+
+    def sync_mmap_index(self, doc_names: list[str] | None = None) -> dict[str, int]:
+        """Rebuild local index segments from the Postgres source of truth.
+
+        Args:
+            doc_names (list[str] | None): documents to sync, all if None
+
+        Returns:
+            dict[str, int]: rows written per document
+        """
+        index = self.mmap_index or MmapVectorIndex(VECTOR_INDEX_DIR, dtype=VECTOR_INDEX_DTYPE)
+        params = {"collection": COLLECTION_NAME}
+        scope = ""
+        if doc_names:
+            scope = "AND e.cmetadata->>'doc_name' = ANY(:doc_names)"
+            params["doc_names"] = list(doc_names)
+        with self.db_instance.session() as session:
+            rows = session.execute(
+                text(
+                    f"""
+                    SELECT e.embedding, e.cmetadata
+                    FROM langchain_pg_embedding e
+                    JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+                    WHERE c.name = :collection AND e.cmetadata->>'doc_name' IS NOT NULL {scope}
+                    """
+                ),
+                params,
+            ).all()
+        by_doc = {}
+        for embedding, metadata in rows:
+            vectors, metadatas = by_doc.setdefault(metadata["doc_name"], ([], []))
+            vectors.append(to_float_list(embedding))
+            metadatas.append(dict(metadata))
+        for doc_name, (vectors, metadatas) in by_doc.items():
+            index.write_segment(doc_name, vectors, metadatas)
+        return {doc_name: len(vectors) for doc_name, (vectors, _) in by_doc.items()}
+
+    def hybrid_search(self, query: str, thread_id: int = 0, k: int = 10) -> list[Document]:
+        """Vector and full-text search run concurrently, fused with reciprocal rank fusion."""
+        if not self.fulltext_ready:
+            return self.vector_search(query, thread_id=thread_id, k=k)
+        fetch_k = max(k * HYBRID_FETCH_FACTOR, k)
+        doc_names = self.thread_doc_names(thread_id)
+        vector_future = self.search_pool.submit(
+            self.vector_search, query, thread_id, fetch_k, doc_names
+        )
+        lexical_future = self.search_pool.submit(
+            self.lexical_search.search, query, fetch_k, doc_names, thread_id
+        )
+        return reciprocal_rank_fusion(
+            [vector_future.result(), lexical_future.result()], k=k
+        )
+
+    def retrive(self,query:str,thread_id:int=0,k:int=10,mode:str|None=None):
+        """Top k chunks of a thread, served from the retrieval cache when possible.
+
+        Args:
+            mode (str | None): "vector" or "hybrid", defaults to RETRIEVAL_MODE
+        """
+        mode = mode or RETRIEVAL_MODE
+        if mode not in ("hybrid", "vector"):
+            raise ValueError(f"Unknown retrieval mode {mode}")
+        if self.retrieval_cache is not None:
+            cached = self.retrieval_cache.get(query, thread_id, k, mode)
+            if cached is not None:
+                return cached
+        start = time.perf_counter()
+        if mode == "hybrid":
+            documents = self.hybrid_search(query, thread_id=thread_id, k=k)
+        else:
+            documents = self.vector_search(query, thread_id=thread_id, k=k)
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.put(
+                query, thread_id, k, mode, documents, latency=time.perf_counter() - start
+            )
+        return documents
+
+    def retrive_reranked(self, query: str, thread_id: int = 0, k: int = 10, mode: str | None = None) -> list[Document]:
+        """Top k chunks for a prompt, over-fetched and reranked when RERANK is enabled."""
+        if self.reranker is None:
+            return self.retrive(query, thread_id=thread_id, k=k, mode=mode)
+        candidates = self.retrive(
+            query, thread_id=thread_id, k=max(k, self.reranker.max_candidates), mode=mode
+        )
+        return self.reranker.rerank(query, candidates, k)
+
+
 if __name__ == "__main__":
     parser = Retriver()
     parser.parse(
@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("plotly")
+
+from bytes.agent_services import chart_builder
+from bytes.agent_services.chart_builder import build_chart, table_to_frame
+
+
+def test_ragged_rows_are_unsupported():
+    table = [["Year", "Revenue"], ["FY23", "10"], ["FY24", "12", "extra"]]
+    before = chart_builder.counters["unsupported"]
+    assert table_to_frame(table) is None
+    assert build_chart(table) is None
+    assert chart_builder.counters["unsupported"] == before + 1
+
+
+def test_columns_and_rows_length_mismatch_is_unsupported():
+    table = {"columns": ["Year", "Revenue"], "data": [["FY23", 10, 1], ["FY24", 12, 2]]}
+    assert build_chart(table) is None
+
+
+def test_column_oriented_dict():
+    table = {"Year": ["FY22", "FY23", "FY24"], "Revenue": ["1,000", "1,200", "1,500"]}
+    frame = table_to_frame(table)
+    assert list(frame.columns) == ["Year", "Revenue"]
+    chart = json.loads(build_chart(table, hint="revenue trend"))
+    assert chart["data"][0]["x"] == ["FY22", "FY23", "FY24"]
+    assert chart["data"][0]["y"] == [1000, 1200, 1500]
+
+
+def test_column_oriented_dict_with_uneven_columns():
+    assert table_to_frame({"Year": ["FY23", "FY24"], "Revenue": [1]}) is None
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("plotly")
+
+from bytes.agent_services.chart_executor import ChartExecutor
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "chart-test-secret")
+    monkeypatch.setenv("GROQ_API_KEY", "chart-test-groq-key")
+    executor = ChartExecutor(workers=1, timeout=30, memory_mb=0)
+    yield executor
+    executor.shutdown()
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/environ"), reason="needs /proc")
+def test_worker_process_environment_has_no_secrets(executor):
+    environ = executor.execute("fig_json = open('/proc/self/environ', 'rb').read().decode()")
+    assert not environ.startswith("error:")
+    assert "chart-test-secret" not in environ
+    assert "chart-test-groq-key" not in environ
+    assert "SECRET_KEY" not in environ
+
+
+def test_worker_os_environ_has_no_secrets(executor):
+    environ = executor.execute("import os\nfig_json = repr(sorted(os.environ))")
+    assert "SECRET_KEY" not in environ
+    assert "GROQ_API_KEY" not in environ
+
+
+def test_snippet_output_does_not_break_the_protocol(executor):
+    result = executor.execute("print('noise')\nfig = go.Figure(go.Bar(x=[1, 2], y=[3, 4]))")
+    assert '"type":"bar"' in result
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="slow process start")
+def test_timeout_replaces_the_worker(executor):
+    executor.timeout = 2
+    assert executor.execute("while True: pass").startswith("error: timed out")
+    executor.timeout = 30
+    assert executor.execute("fig_json = 'ok'") == "ok"